@@ -0,0 +1,343 @@
+"""
+Microbenchmarks of the pages plugin: page registration, app startup, route
+resolution, path template compilation, and the index and router responses.
+
+Synthetic apps of 10, 1,000 and 10,000 pages mix static paths and
+`path_template` routes, and the demo apps of `docs/demos` that only need dash
+are measured as realistic fixtures.
+
+    pip install -e .
+    python benchmarks/bench_pages.py
+    python benchmarks/bench_pages.py --sizes 10 1000 --compare benchmarks/results/<previous>.json
+
+The results are saved as JSON, in `benchmarks/results/` by default, and
+`--compare` prints the ratio of each result to a previous run.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import warnings
+from datetime import datetime, timezone
+
+import dash
+from dash import Dash, html
+
+import dash_labs
+from dash_labs.plugins import pages
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEMOS = os.path.join(HERE, os.pardir, "docs", "demos")
+DEMO_APPS = ["multi_page_basics", "multi_page_meta_tags", "multi_page_no_pages_folder"]
+
+
+def measure(func, number=None, repeat=5):
+    """
+    Returns the best time per call of `func`, in seconds. The number of calls
+    per run is picked so that a run takes about 0.2 seconds.
+    """
+    timer = timeit.Timer(func)
+    if number is None:
+        number, _ = timer.autorange()
+        number = max(1, number)
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def measure_once(func, repeat=3):
+    """
+    Returns the best time of `func`, for the benchmarks too slow to loop over.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+@contextlib.contextmanager
+def app_folder(folder):
+    """
+    Runs the block from `folder` with its `pages` package importable, like an
+    app started from its folder, and forgets the imported pages afterwards.
+    """
+    cwd = os.getcwd()
+    os.chdir(folder)
+    sys.path.insert(0, folder)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            yield
+    finally:
+        sys.path.remove(folder)
+        os.chdir(cwd)
+        for module in [
+            m for m in sys.modules if m == "pages" or m.startswith("pages.")
+        ]:
+            del sys.modules[module]
+
+
+def page_paths(size):
+    """
+    Returns `(module, path, path_template)` of the synthetic pages, one page in
+    four has a `path_template`.
+    """
+    for i in range(size):
+        if i % 4 == 3:
+            yield f"pages.asset_{i}", None, f"/section-{i}/<int:asset_id>/<tab>"
+        else:
+            yield f"pages.report_{i}", f"/reports/report-{i}", None
+
+
+def write_pages(folder, size):
+    os.makedirs(os.path.join(folder, "pages"))
+    open(os.path.join(folder, "pages", "__init__.py"), "w").close()
+    for module, path, path_template in page_paths(size):
+        arguments = f"path={path!r}" if path else f"path_template={path_template!r}"
+        with open(os.path.join(folder, *module.split(".")) + ".py", "w") as f:
+            f.write(
+                "from dash import html\n"
+                "from dash_labs.plugins import register_page\n\n"
+                f"register_page(__name__, {arguments})\n\n"
+                "def layout(**kwargs):\n"
+                f"    return html.Div({module!r}, id={module.replace('.', '-')!r})\n"
+            )
+
+
+def sample_pathnames(size, count=1000):
+    """
+    Pathnames to resolve: static paths, template paths and 404s.
+    """
+    rng = random.Random(size)
+    pathnames = []
+    for _ in range(count):
+        i = rng.randrange(size)
+        kind = rng.random()
+        if kind < 0.1:
+            pathnames.append(f"/missing/{i}")
+        elif i % 4 == 3:
+            pathnames.append(f"/section-{i}/{rng.randrange(10**6)}/overview")
+        else:
+            pathnames.append(f"/reports/report-{i}")
+    return pathnames
+
+
+def create_app():
+    # Not an importable module, the `pages` folder is looked up from the working directory
+    app = Dash("bench_app", plugins=[pages])
+    app.layout = html.Div(pages.page_container)
+    return app
+
+
+def router_payload(pathname, search=""):
+    content, store = pages._ID_CONTENT, pages._ID_STORE
+    return {
+        "output": f"..{content}.children...{store}.data..",
+        "outputs": [
+            {"id": content, "property": "children"},
+            {"id": store, "property": "data"},
+        ],
+        "inputs": [
+            {"id": pages._ID_LOCATION, "property": "pathname", "value": pathname},
+            {"id": pages._ID_LOCATION, "property": "search", "value": search},
+        ],
+        "changedPropIds": [f"{pages._ID_LOCATION}.pathname"],
+        "state": [],
+    }
+
+
+def bench_register(size):
+    def register():
+        dash.page_registry = pages._PageRegistry()
+        pages._path_templates.clear()
+        for module, path, path_template in page_paths(size):
+            pages.register_page(
+                module, path=path, path_template=path_template, layout=html.Div()
+            )
+        list(dash.page_registry.values())
+
+    return {"register_page": measure_once(register)}
+
+
+def bench_app(size):
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        write_pages(folder, size)
+
+        with app_folder(folder):
+            results["plug"] = measure_once(create_app, repeat=1)
+        with app_folder(folder):
+            pages.configure(lazy_import=True)
+            try:
+                results["plug_lazy_import"] = measure_once(create_app, repeat=1)
+            finally:
+                pages.configure(lazy_import=False)
+
+        with app_folder(folder):
+            app = create_app()
+            client = app.server.test_client()
+            # The first request builds the route index and the validation layout
+            results["first_request"] = measure_once(lambda: client.get("/"), repeat=1)
+
+            pathnames = sample_pathnames(size)
+            path_ids = [p.strip("/") for p in pathnames]
+
+            def resolve_all():
+                for path_id in path_ids:
+                    pages._path_to_page(app, path_id)
+
+            for cache_size in (0, 1024):
+                pages.configure(route_cache_size=cache_size)
+                seconds = measure(resolve_all, repeat=3) / len(path_ids)
+                results[f"resolve_route_cache_{cache_size}"] = seconds
+            pages.configure(route_cache_size=1024)
+
+            # The index behind the route cache, a trie walk converting the path variables
+            route_index = pages._get_route_index()
+
+            def match_all():
+                for path_id in path_ids:
+                    route_index.match(path_id)
+
+            results["route_index_match"] = measure(match_all, repeat=3) / len(path_ids)
+
+            templates = [
+                page["path_template"]
+                for page in dash.page_registry.values()
+                if page["path_template"]
+            ]
+
+            def compile_all():
+                for template in templates:
+                    pages._compile_template(template)
+
+            results["compile_template"] = measure(compile_all, repeat=3) / len(
+                templates
+            )
+
+            results.update(bench_requests(client, pathnames[:20]))
+    return results
+
+
+def bench_requests(client, pathnames):
+    results = {}
+    for cache_size in (0, 256):
+        pages.configure(index_cache_size=cache_size)
+        results[f"index_cache_{cache_size}"] = measure(
+            lambda: [client.get(p) for p in pathnames], repeat=3
+        ) / len(pathnames)
+    pages.configure(index_cache_size=256)
+    results["router"] = measure(
+        lambda: [
+            client.post("/_dash-update-component", json=router_payload(p))
+            for p in pathnames
+        ],
+        repeat=3,
+    ) / len(pathnames)
+    return results
+
+
+def bench_demo(name):
+    folder = os.path.abspath(os.path.join(DEMOS, name))
+    results = {}
+    with app_folder(folder):
+        start = time.perf_counter()
+        app = runpy.run_path(os.path.join(folder, "app.py"), run_name="bench_demo")[
+            "app"
+        ]
+        results["plug"] = time.perf_counter() - start
+        client = app.server.test_client()
+        results["first_request"] = measure_once(lambda: client.get("/"), repeat=1)
+        pathnames = [
+            page["path"]
+            for page in dash.page_registry.values()
+            if not page["path_template"]
+        ]
+        results.update(bench_requests(client, pathnames))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=HERE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous):
+    print(f"\n{'benchmark':<60} {'previous':>12} {'current':>12} {'ratio':>7}")
+    for name, seconds in results.items():
+        if name in previous:
+            print(
+                f"{name:<60} {previous[name] * 1e6:>10.1f}us {seconds * 1e6:>10.1f}us "
+                f"{seconds / previous[name]:>7.2f}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10, 1000, 10000], help="Page counts."
+    )
+    parser.add_argument(
+        "--no-demos", action="store_true", help="Skip the `docs/demos` apps."
+    )
+    parser.add_argument("-o", "--output", help="Path of the JSON results.")
+    parser.add_argument("--compare", help="JSON results of a previous run.")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for size in args.sizes:
+        print(f"{size} pages...", flush=True)
+        for name, seconds in {**bench_register(size), **bench_app(size)}.items():
+            results[f"synthetic_{size}.{name}"] = seconds
+        print(f"  {len(dash.page_registry)} pages registered", flush=True)
+    if not args.no_demos:
+        for demo in DEMO_APPS:
+            print(f"{demo}...", flush=True)
+            for name, seconds in bench_demo(demo).items():
+                results[f"{demo}.{name}"] = seconds
+
+    for name, seconds in results.items():
+        print(f"{name:<60} {seconds * 1e6:>12.1f}us")
+
+    run = dict(
+        date=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        commit=git_commit(),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        dash=dash.__version__,
+        dash_labs=dash_labs.__version__,
+        results=results,
+    )
+    output = args.output
+    if output is None:
+        date = run["date"][:19].replace(":", "")
+        output = os.path.join(HERE, "results", f"pages-{date}-{run['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(run, f, indent=2)
+    print(f"\nSaved {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)["results"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import importlib
+import os
+import sys
+
+import dash
+
+from dash_labs.plugins import pages
+
+
+def _load_app(spec, folder):
+    module_name, _, variable = spec.partition(":")
+    sys.path.insert(0, os.path.abspath(folder))
+    app = getattr(importlib.import_module(module_name), variable or "app", None)
+    if not isinstance(app, dash.Dash):
+        raise SystemExit(f"{spec} is not a Dash app")
+    return app
+
+
+def _pages_manifest(args):
+    pages_folder = os.path.join(args.app_folder, "pages")
+    if not os.path.isdir(pages_folder):
+        raise SystemExit(f"A folder called `pages` does not exist in {args.app_folder}")
+    app = _load_app(args.app, args.app_folder) if args.app else None
+    print(pages.build_manifest(pages_folder, args.output, app))
+
+
+def _pages_export(args):
+    # Like `gunicorn`, the app module is imported from the working directory
+    app = _load_app(args.app, os.getcwd())
+    files = pages.export_pages(app, args.output_folder, args.base_url)
+    print("\n".join(files))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m dash_labs")
+    commands = parser.add_subparsers(dest="command")
+    # Not a keyword argument of `add_subparsers` before Python 3.7
+    commands.required = True
+
+    manifest = commands.add_parser(
+        "pages-manifest",
+        help="Write the manifest of the `pages` folder of an app.",
+    )
+    manifest.add_argument("app_folder", help="The folder containing `pages`.")
+    manifest.add_argument(
+        "-o",
+        "--output",
+        help="Path of the manifest, default `pages/_pages_manifest.json`.",
+    )
+    manifest.add_argument(
+        "--app",
+        help="The app as `module:variable` in the app folder, to also save the "
+        "validation skeletons of its pages.",
+    )
+    manifest.set_defaults(func=_pages_manifest)
+
+    export = commands.add_parser(
+        "pages-export",
+        help="Write the index HTML and layout JSON of the static pages of an app.",
+    )
+    export.add_argument(
+        "app", help="The app as `module:variable`, the variable defaults to `app`."
+    )
+    export.add_argument("output_folder", help="The folder to write the files to.")
+    export.add_argument(
+        "-b",
+        "--base-url",
+        default="http://localhost",
+        help="Scheme and host of the page URLs in the meta tags.",
+    )
+    export.set_defaults(func=_pages_export)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
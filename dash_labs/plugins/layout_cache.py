@@ -0,0 +1,213 @@
+import contextlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from _plotly_utils.utils import PlotlyJSONEncoder
+
+
+class LayoutCache:
+    """
+    Base class to store the layouts rendered by the layout functions of the pages,
+    used with ``register_page(cache=...)``.
+    """
+
+    undefined = object()
+
+    def get(self, key: str):
+        """
+        Get a rendered layout.
+
+        :param key: Key of the page, path variables and query parameters.
+        :return: The layout, or ``LayoutCache.undefined`` if it isn't cached.
+        """
+        raise NotImplementedError
+
+    def set(self, key: str, layout):
+        """
+        Store a rendered layout.
+
+        :param key: Key of the page, path variables and query parameters.
+        :param layout: The layout returned by the layout function.
+        """
+        raise NotImplementedError
+
+    @contextlib.contextmanager
+    def lock(self, key: str):
+        """
+        Context manager held while a layout is rendered, so that the workers sharing
+        the cache render it once. The requests of a process are already coalesced.
+
+        :param key: Key of the page, path variables and query parameters.
+        """
+        yield
+
+
+class MemoryLayoutCache(LayoutCache):
+    """
+    In process LRU cache of the layouts, with an optional time to live.
+    Each worker process has its own copy of the cache.
+
+    **Example**
+
+    .. code-block::
+
+        from dash_labs.plugins import register_page
+        from dash_labs.plugins.layout_cache import MemoryLayoutCache
+
+        register_page(__name__, cache=MemoryLayoutCache(maxsize=32, ttl=600))
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        """
+        :param maxsize: Number of layouts to keep, the least recently used are evicted first.
+        :param ttl: Seconds after which a layout is rendered again, never if None.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            if key not in self._layouts:
+                return self.undefined
+            expires, layout = self._layouts[key]
+            if expires is not None and expires < time.monotonic():
+                del self._layouts[key]
+                return self.undefined
+            self._layouts.move_to_end(key)
+            return layout
+
+    def set(self, key: str, layout):
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._layouts[key] = (expires, layout)
+            self._layouts.move_to_end(key)
+            while len(self._layouts) > self.maxsize:
+                self._layouts.popitem(last=False)
+
+
+class DiskcacheLayoutCache(LayoutCache):
+    """
+    Diskcache based layout cache, shared by the worker processes of a machine.
+    The layouts are stored as JSON.
+
+    **Example**
+
+    .. code-block::
+
+        from dash_labs.plugins import register_page
+        from dash_labs.plugins.layout_cache import DiskcacheLayoutCache
+
+        register_page(__name__, cache=DiskcacheLayoutCache("./layout-cache", ttl=600))
+    """
+
+    def __init__(self, directory=None, ttl=None, lock_timeout=60, **settings):
+        """
+        :param directory: Directory where the layouts are kept, a temporary directory if None.
+        :param ttl: Seconds after which a layout is rendered again, never if None.
+        :param lock_timeout: Seconds after which the lock of a layout being rendered by
+            another worker expires.
+        :param settings: Additional settings of ``diskcache.Cache``, e.g. ``size_limit``.
+        """
+        try:
+            import diskcache
+        except ImportError as err:
+            raise ImportError(
+                "Diskcache is not installed, install it with "
+                "`pip install dash-labs[diskcache]`"
+            ) from err
+
+        self.cache = diskcache.Cache(directory=directory, **settings)
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self._diskcache = diskcache
+
+    def get(self, key: str):
+        value = self.cache.get(key, default=None)
+        if value is None:
+            return self.undefined
+        return json.loads(value)
+
+    def set(self, key: str, layout):
+        self.cache.set(key, json.dumps(layout, cls=PlotlyJSONEncoder), expire=self.ttl)
+
+    def lock(self, key: str):
+        return self._diskcache.Lock(self.cache, "lock/" + key, expire=self.lock_timeout)
+
+
+class RedisLayoutCache(LayoutCache):
+    """
+    Layout cache using redis, shared by all the workers of the app.
+    The layouts are stored as JSON.
+
+    **Example**
+
+    .. code-block::
+
+        from dash_labs.plugins import register_page
+        from dash_labs.plugins.layout_cache import RedisLayoutCache
+
+        register_page(__name__, cache=RedisLayoutCache(host="localhost", ttl=600))
+    """
+
+    def __init__(
+        self,
+        host="localhost",
+        port=6379,
+        db=0,
+        ttl=None,
+        prefix="dash/layout/",
+        lock_timeout=60,
+        **connection_kwargs,
+    ):
+        """
+        :param ttl: Seconds after which a layout is rendered again, never if None.
+        :param prefix: Prefix of the redis keys.
+        :param lock_timeout: Seconds after which the lock of a layout being rendered by
+            another worker expires, and the longest a worker waits for it.
+        """
+        try:
+            import redis
+        except ImportError as err:
+            raise ImportError(
+                "Redis is not installed, install it with "
+                "`pip install dash-labs[redis]`"
+            ) from err
+
+        self.pool = redis.ConnectionPool(
+            host=host, port=port, db=db, **connection_kwargs
+        )
+        self.r = redis.Redis(connection_pool=self.pool)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+
+    def get(self, key: str):
+        value = self.r.get(self.prefix + key)
+        if value is None:
+            return self.undefined
+        return json.loads(value)
+
+    def set(self, key: str, layout):
+        self.r.set(
+            self.prefix + key, json.dumps(layout, cls=PlotlyJSONEncoder), ex=self.ttl
+        )
+
+    @contextlib.contextmanager
+    def lock(self, key: str):
+        lock = self.r.lock(
+            self.prefix + "lock/" + key,
+            timeout=self.lock_timeout,
+            blocking_timeout=self.lock_timeout,
+        )
+        # Render the layout anyway if the other worker takes too long
+        acquired = lock.acquire()
+        try:
+            yield
+        finally:
+            # The lock may have expired while the layout was rendered
+            if acquired and lock.owned():
+                lock.release()
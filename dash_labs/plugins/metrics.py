@@ -0,0 +1,120 @@
+import bisect
+import threading
+
+# Upper bounds of the histogram buckets, the last bucket is `+Inf`
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7)
+
+
+class Metrics:
+    """
+    Counters, gauges and histograms safe to update from the threads of a Flask
+    worker, rendered in the Prometheus text format.
+
+    The metrics are declared once with their label names, and updated with the
+    values of their labels as a tuple, e.g.
+
+    .. code-block::
+
+        metrics = Metrics("dash_pages")
+        metrics.counter("not_found_total", "Pathnames without a page.", ())
+        metrics.histogram("phase_seconds", "Routing time.", ("page", "phase"))
+
+        metrics.inc("not_found_total", ())
+        metrics.observe("phase_seconds", ("pages.home", "layout"), 0.012)
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self._definitions = {}
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _declare(self, kind, name, documentation, labels, buckets=None):
+        self._definitions[name] = (kind, documentation, tuple(labels), buckets)
+        self._values[name] = {}
+
+    def counter(self, name, documentation, labels):
+        self._declare("counter", name, documentation, labels)
+
+    def gauge(self, name, documentation, labels):
+        self._declare("gauge", name, documentation, labels)
+
+    def histogram(self, name, documentation, labels, buckets=SECONDS_BUCKETS):
+        self._declare("histogram", name, documentation, labels, tuple(buckets))
+
+    def inc(self, name, labels, value=1):
+        values = self._values[name]
+        with self._lock:
+            values[labels] = values.get(labels, 0) + value
+
+    def set(self, name, labels, value):
+        values = self._values[name]
+        with self._lock:
+            values[labels] = value
+
+    def observe(self, name, labels, value):
+        buckets = self._definitions[name][3]
+        # The count of each bucket, then the sum of the observed values
+        index = bisect.bisect_left(buckets, value)
+        values = self._values[name]
+        with self._lock:
+            counts = values.get(labels)
+            if counts is None:
+                counts = values[labels] = [0] * (len(buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def clear(self):
+        with self._lock:
+            for values in self._values.values():
+                values.clear()
+
+    def render(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            snapshot = {
+                name: {
+                    labels: list(value) if isinstance(value, list) else value
+                    for labels, value in values.items()
+                }
+                for name, values in self._values.items()
+            }
+
+        lines = []
+        for name, definition in self._definitions.items():
+            kind, documentation, label_names, buckets = definition
+            full_name = f"{self.namespace}_{name}"
+            lines.append(f"# HELP {full_name} {documentation}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for labels, value in sorted(snapshot[name].items()):
+                pairs = list(zip(label_names, labels))
+                if kind != "histogram":
+                    lines.append(f"{full_name}{_labels(pairs)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ("+Inf",), value):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else _number(bound)
+                    lines.append(
+                        f"{full_name}_bucket{_labels(pairs + [('le', le)])} {cumulative}"
+                    )
+                lines.append(f"{full_name}_sum{_labels(pairs)} {_number(value[-1])}")
+                lines.append(f"{full_name}_count{_labels(pairs)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
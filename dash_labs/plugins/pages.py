@@ -1,14 +1,38 @@
 from dash import callback, Output, Input, html, dcc
+from dash import _callback
+from dash.development.base_component import Component
+from _plotly_utils.utils import PlotlyJSONEncoder
 import dash
+from .layout_cache import LayoutCache, MemoryLayoutCache
+from .metrics import Metrics, BYTES_BUCKETS
+from ..version import __version__
+from ..session import SessionValue
 import os
+import ast
+import asyncio
+import copy
 import importlib
-from collections import OrderedDict
+import inspect
+import functools
+import gc
+import gzip
+import hashlib
+import json
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
 import flask
-from os import listdir
-from os.path import isfile, join
 from textwrap import dedent
-from urllib.parse import parse_qs
+from urllib.parse import parse_qs, urlparse
 from keyword import iskeyword
+import re
+import string
+import sys
+import tempfile
+import uuid
 import warnings
 
 
@@ -23,6 +47,23 @@ _ID_LOCATION = "_pages_plugin_location"
 _ID_STORE = "_pages_plugin_store"
 _ID_DUMMY = "_pages_plugin_dummy"
 
+_config = dict(
+    route_cache_size=1024,
+    lazy_import=False,
+    manifest=None,
+    trust_manifest=False,
+    serialize_static_layouts=True,
+    compress_static_layouts=False,
+    index_cache_size=256,
+    minify_index=False,
+    prerender_layout=False,
+    client_cache_size=32,
+    prefetch=None,
+    process_pool_workers=None,
+    metrics_path=None,
+    page_callbacks=False,
+)
+
 page_container = html.Div(
     [
         dcc.Location(id=_ID_LOCATION),
@@ -33,6 +74,95 @@ page_container = html.Div(
 )
 
 
+def configure(**options):
+    """
+    Sets options of the pages plugin, e.g.
+    `dl.plugins.pages.configure(route_cache_size=4096)`
+
+    - `route_cache_size`:
+       The number of pathnames for which the resolved page and path variables are kept
+       in an LRU cache, including pathnames that resolve to the 404 page.
+       `None` makes the cache unbounded and `0` disables it. Default `1024`.
+       Use `route_cache_info()` to see the hits and misses of the cache.
+
+    - `lazy_import`:
+       When `True`, the modules in `pages/` are not imported when the app starts if their
+       `register_page` arguments are literals, like strings, numbers and lists, and they
+       don't define callbacks. The page is registered from the source of the module,
+       which is imported the first time the page is visited or by `load_pages()`.
+       The modules imported by a lazy page must not define callbacks either, the callbacks
+       defined after the first request are ignored, with a warning. Set it before creating
+       the app. Default `False`.
+
+    - `manifest`:
+       Path of a JSON manifest of the modules in `pages/`, or `True` for `pages/_pages_manifest.json`.
+       It records the modification time, size and hash of each module, whether it registers a page
+       and its `register_page` arguments for `lazy_import`. The modules that didn't change since the
+       manifest was written are not read again when the app starts. The skeleton of each page used
+       for the `validation_layout` is also saved so that the page layouts are not rendered again,
+       until a Python file of the app or the version of dash or dash_labs changes.
+       Default `None`, no manifest.
+
+    - `trust_manifest`:
+       When `True`, the modules listed in the manifest are used without walking the `pages` folder
+       or checking the files, for deployments where the manifest is built with
+       `python -m dash_labs pages-manifest <app folder> --app <module>:<app>` and the files don't
+       change. The manifest isn't written by the app. Default `False`.
+
+    - `serialize_static_layouts`:
+       When `True`, the layouts that are components rather than functions are serialized to JSON
+       once and the JSON is inserted as is in the responses of the routing callback. The layouts
+       holding `dash_labs.session` values are still serialized for each visit. Default `True`.
+
+    - `compress_static_layouts`:
+       When `True`, the routing responses of pages with a static layout and title are also gzipped
+       once and served compressed to the browsers that accept it. Default `False`.
+
+    - `index_cache_size`:
+       Number of index pages kept in an LRU cache, for the routes whose `title` and `description`
+       are not functions. Default `256`, `0` to disable the cache.
+
+    - `minify_index`:
+       When `True`, the indentation and line breaks of the index page template are removed. Default `False`.
+
+    - `prerender_layout`:
+       When `True`, the layout of the page being loaded is rendered in the initial app layout,
+       which saves the request of the router callback on the first load. Must be set before
+       the app is created. Default `False`.
+
+    - `client_cache_size`:
+       Number of layouts of the pages registered with `client_cache=True` that are kept
+       by each browser tab. Default `32`.
+
+    - `prefetch`:
+       `"hover"` to prefetch the layout of the `client_cache` pages when the mouse is over a link
+       to them, `"viewport"` to also prefetch them when a link to them scrolls into view, or `None`.
+       Default `None`.
+
+    - `process_pool_workers`:
+       Number of processes rendering the layouts of the pages registered with `process_pool=True`.
+       Default `None`, the number of CPUs.
+
+    - `metrics_path`:
+       Path of an endpoint serving the routing metrics of the pages in the Prometheus text format,
+       e.g. `"/_dash-pages-metrics"`. The metrics are only gathered when it is set, before the app
+       is created. Default `None`.
+
+    - `page_callbacks`:
+       When `True`, the callbacks defined in a page module are only sent to the browser with the
+       callbacks of the app once the page is visited, instead of the callbacks of all the pages on
+       the first load. The first visit of a page with callbacks from another page reloads the app.
+       Must be set before the app is created. Default `False`.
+    """
+    for option in options:
+        if option not in _config:
+            raise ValueError(
+                f"Unknown option `{option}`, expected one of {list(_config)}"
+            )
+    _config.update(options)
+    _invalidate_routes()
+
+
 def register_page(
     module,
     path=None,
@@ -44,7 +174,14 @@ def register_page(
     image=None,
     image_url=None,
     redirect_from=None,
+    redirect_status=301,
     layout=None,
+    cache=None,
+    meta_cache=None,
+    query=None,
+    cache_control=None,
+    client_cache=False,
+    process_pool=False,
     **kwargs,
 ):
     """
@@ -73,6 +210,10 @@ def register_page(
        then receives the <variable_name> as a keyword argument.
        e.g. path_template= "/asset/<asset_id>"
             then if pathname in browser is "/assets/a100" then layout will receive **{"asset_id":"a100"}
+       Variables can be typed with a converter: <int:variable_name>, <float:variable_name>,
+       <uuid:variable_name> or <path:variable_name>. The layout then receives the converted value,
+       and a pathname that doesn't convert falls through to the 404 page.
+       `path` matches the rest of the pathname, slashes included, and must be the last segment.
 
     - `name`:
        The name of the link.
@@ -109,10 +250,58 @@ def register_page(
     - `redirect_from`:
        A list of paths that should redirect to this page.
        For example: `redirect_from=['/v2', '/v3']`
+       The paths can have variables, which are carried to the `path_template` of the page,
+       e.g. `redirect_from=['/old-asset/<asset_id>']` with `path_template='/asset/<asset_id>'`,
+       and end with a `<path:...>` wildcard variable.
+
+    - `redirect_status`:
+       The HTTP status code of the `redirect_from` redirects, 301 by default.
 
     - `layout`:
        The layout function or component for this page.
        If not supplied, then looks for `layout` from within the supplied `module`.
+       The layout, `title` and `description` functions can be `async def` functions, they are
+       run on an event loop of the plugin so that they can await their I/O concurrently.
+
+    - `meta_cache`:
+       Memoize the values returned by the `title` and `description` functions by path variables,
+       with the same options as `cache`, e.g. a number of seconds for an in process cache with
+       that time to live. Without it, the functions are called again by the index page and by
+       the router callback of the same visit, which are two requests.
+
+    - `query`:
+       The query parameters of the page, as a dict of their names to their converter, one of
+       `"string"`, `"int"`, `"float"`, `"uuid"` and `"bool"` or a function, or to a
+       `(converter, default)` tuple. A converter in a list, e.g. `["int"]`, keeps all the values
+       of a repeated parameter. The layout function then receives the declared parameters,
+       converted or set to their default if they are missing or don't convert, and only them.
+       e.g. `query={"tab": ("string", "summary"), "year": "int", "ids": ["int"]}`
+       If not supplied, the layout receives all the query parameters as strings.
+
+    - `cache`:
+       Memoize the layouts returned by the layout function by path variables and query parameters.
+       `True` for an in process LRU cache, a number of seconds for an in process LRU cache
+       with that time to live, or a `LayoutCache` from `dash_labs.plugins.layout_cache`, e.g.
+       a `DiskcacheLayoutCache` or `RedisLayoutCache` to share the layouts between workers.
+       Only use it when the layout only depends on the path variables and query parameters.
+
+    - `cache_control`:
+       The `Cache-Control` header of the index HTML of this page, e.g. `"public, max-age=300"`
+       or `"no-cache"` to let browsers and proxies store it but revalidate it with its ETag.
+       If not supplied, no `Cache-Control` header is set.
+
+    - `client_cache`:
+       When `True`, the browser keeps the layouts of this page by pathname and query string
+       and doesn't request them again when navigating back to the page, and the page can be
+       prefetched, see the `prefetch` option. Only use it for pages whose layout doesn't change
+       while the app is open.
+
+    - `process_pool`:
+       When `True`, the layout function is called in a pool of processes shared by the pages,
+       which return the layout serialized to JSON. CPU bound layouts, e.g. building large figures,
+       then use several cores instead of waiting for the GIL of the worker. The layout function
+       must be defined at the top level of its module, so that the processes can import it.
+       Requires Python 3.7 or later.
 
     - `**kwargs`:
        Arbitrary keyword arguments that can be stored
@@ -159,12 +348,19 @@ def register_page(
     # COERCE
     # - Set the order
     # - Inferred paths
+    if path_template is None:
+        _path_templates.pop(module, None)
+    else:
+        _path_templates[module] = _compile_template(path_template)
+    if query is None:
+        _query_schemas.pop(module, None)
+    else:
+        _query_schemas[module] = _compile_query(module, query)
+
     page = dict(
         module=module,
         supplied_path=path,
-        path_template=None
-        if path_template is None
-        else _validate_template(path_template),
+        path_template=path_template,
         path=(path if path is not None else _infer_path(module, path_template)),
         supplied_name=name,
         name=(name if name is not None else _filename_to_name(module)),
@@ -185,88 +381,276 @@ def register_page(
         supplied_image=image,
         image_url=image_url,
     )
-    page.update(redirect_from=redirect_from)
-
-    dash.page_registry[module] = page
+    if cache_control is not None and not isinstance(cache_control, str):
+        raise Exception(
+            f"`cache_control` of {module} must be a `Cache-Control` header value, "
+            f"e.g. 'public, max-age=300', got {cache_control!r}"
+        )
+    if process_pool and sys.version_info < (3, 7):
+        # The processes are spawned with `mp_context`, new in Python 3.7
+        raise Exception(f"`process_pool` of {module} requires Python 3.7 or later")
+    if redirect_status not in _REDIRECT_STATUSES:
+        raise Exception(
+            f"`redirect_status` of {module} must be one of {list(_REDIRECT_STATUSES)}, "
+            f"got {redirect_status!r}"
+        )
+    if redirect_from:
+        for source in redirect_from:
+            _compile_template(source)
+    page.update(
+        redirect_from=redirect_from,
+        redirect_status=redirect_status,
+        cache=_coerce_layout_cache(cache),
+        meta_cache=_coerce_layout_cache(meta_cache, "meta_cache"),
+        cache_control=cache_control,
+        query=query,
+        client_cache=client_cache,
+        process_pool=process_pool,
+    )
 
     if layout is not None:
         # Override the layout found in the file set during `plug`
-        dash.page_registry[module]["layout"] = layout
+        page["layout"] = layout
+
+    if module in _importing and module in dash.page_registry:
+        # A lazy page registering itself on import. The entry is updated in place,
+        # the registry may be iterated by other requests.
+        page.pop("order")
+        page.pop("layout", None)
+        page.pop("cache")
+        dash.page_registry[module].update(page)
+        return
+
+    if not isinstance(dash.page_registry, _PageRegistry):
+        dash.page_registry = _PageRegistry(dash.page_registry)
+    dash.page_registry[module] = page
+    _invalidate_routes()
+
 
-    # set home page order
-    order_supplied = any(
-        p["supplied_order"] is not None for p in dash.page_registry.values()
+def _coerce_layout_cache(cache, option="cache"):
+    if cache is None or cache is False:
+        return None
+    if isinstance(cache, LayoutCache):
+        return cache
+    if cache is True:
+        return MemoryLayoutCache()
+    if isinstance(cache, (int, float)):
+        return MemoryLayoutCache(ttl=cache)
+    raise Exception(
+        f"Invalid `{option}`: {cache!r}  Expected `True`, a number of seconds or a `LayoutCache`"
     )
 
-    for p in dash.page_registry.values():
-        p["order"] = (
-            0 if p["path"] == "/" and not order_supplied else p["supplied_order"]
-        )
 
-    # sorted by order then by module name
-    page_registry_list = sorted(
-        dash.page_registry.values(),
-        key=lambda i: (str(i.get("order", i["module"])), i["module"]),
-    )
+class _PageRegistry(OrderedDict):
+    """
+    The `OrderedDict` used as `dash.page_registry`.
+
+    `register_page` only adds the page, the pages are sorted by `order` and then
+    by module name the next time the registry is iterated. Registering many pages
+    costs a single sort rather than one sort of the whole registry per page.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._sorted = True
+        self._order_supplied = False
+        super().__init__(*args, **kwargs)
+
+    def __setitem__(self, key, page):
+        super().__setitem__(key, page)
+        self._sorted = False
+
+        # set home page order
+        if page.get("supplied_order") is not None:
+            if not self._order_supplied:
+                self._order_supplied = True
+                for p in super().values():
+                    p["order"] = p["supplied_order"]
+        else:
+            page["order"] = (
+                0 if page.get("path") == "/" and not self._order_supplied else None
+            )
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._sorted = False
+
+    def _sort(self):
+        if self._sorted:
+            return
+        self._sorted = True
+
+        pages = list(super().items())
+        self._order_supplied = any(p["supplied_order"] is not None for _, p in pages)
+        for _, p in pages:
+            p["order"] = (
+                0
+                if p["path"] == "/" and not self._order_supplied
+                else p["supplied_order"]
+            )
+
+        # sorted by order then by module name
+        for key, _ in sorted(
+            pages,
+            key=lambda i: (str(i[1].get("order", i[1]["module"])), i[1]["module"]),
+        ):
+            self.move_to_end(key)
+
+    def __iter__(self):
+        self._sort()
+        return super().__iter__()
+
+    def __reversed__(self):
+        self._sort()
+        return super().__reversed__()
+
+    def keys(self):
+        self._sort()
+        return super().keys()
+
+    def values(self):
+        self._sort()
+        return super().values()
+
+    def items(self):
+        self._sort()
+        return super().items()
+
+    def __repr__(self):
+        self._sort()
+        return super().__repr__()
+
+
+class _AssetsIndex:
+    """
+    The image files at the top level of the assets folder, by file name
+    without extension. The folder is scanned once and the index is shared
+    by all the pages inferring their image.
+    """
+
+    valid_extensions = ["apng", "avif", "gif", "jpeg", "png", "webp"]
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._images = None
+        self._mtime = None
+
+    def _folder_mtime(self):
+        try:
+            return os.stat(self.folder).st_mtime
+        except OSError:
+            return None
+
+    def _scan(self):
+        self._mtime = self._folder_mtime()
+        self._images = {}
+        if self._mtime is None:
+            return
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                fn_without_extension, _, extension = entry.name.partition(".")
+                if extension.lower() in self.valid_extensions and entry.is_file():
+                    self._images.setdefault(fn_without_extension, []).append(entry.name)
 
-    dash.page_registry = OrderedDict([(p["module"], p) for p in page_registry_list])
+    def images(self, refresh=False):
+        """
+        With `refresh`, the folder is scanned again if it changed since the last scan.
+        """
+        if self._images is None or (refresh and self._folder_mtime() != self._mtime):
+            self._scan()
+        return self._images
 
 
-def _infer_image(module):
+_assets_index = _AssetsIndex("assets")
+
+
+def _infer_image(module, refresh=False):
     """
     Return:
     - A page specific image: `assets/<title>.<extension>` is used, e.g. `assets/weekly_analytics.png`
     - A generic app image at `assets/app.<extension>`
     - A logo at `assets/logo.<extension>`
     """
-    valid_extensions = ["apng", "avif", "gif", "jpeg", "png", "webp"]
     page_id = module.split(".")[-1]
-    files_in_assets = []
-    # todo need to check for app.get_assets_url instead?
-    if os.path.exists("assets"):
-        files_in_assets = [f for f in listdir("assets") if isfile(join("assets", f))]
-    app_file = None
-    logo_file = None
-    for fn in files_in_assets:
-        fn_without_extension, _, extension = fn.partition(".")
-        if extension.lower() in valid_extensions:
-            if (
-                fn_without_extension == page_id
-                or fn_without_extension == page_id.replace("_", "-")
-            ):
-                return fn
-
-            if fn_without_extension == "app":
-                app_file = fn
+    images = _assets_index.images(refresh)
+    page_files = images.get(page_id) or images.get(page_id.replace("_", "-"))
+    if page_files:
+        return page_files[0]
 
-            if fn_without_extension == "logo":
-                logo_file = fn
+    for fn_without_extension in ["app", "logo"]:
+        if fn_without_extension in images:
+            return images[fn_without_extension][-1]
 
-    if app_file:
-        return app_file
-
-    return logo_file
+    return None
 
 
 def _filename_to_name(filename):
     return filename.split(".")[-1].replace("_", " ").capitalize()
 
 
-def _validate_template(template):
+_PathVariable = namedtuple("_PathVariable", ["name", "converter"])
+
+# Converter name: (regex a path segment must match or None for any, conversion)
+_PATH_CONVERTERS = {
+    "string": (None, str),
+    "int": (re.compile(r"-?\d+"), int),
+    "float": (re.compile(r"-?\d+(\.\d+)?"), float),
+    "uuid": (
+        re.compile(
+            r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+        ),
+        uuid.UUID,
+    ),
+    "path": (None, str),
+}
+
+# Compiled `path_template` segments of each registered module
+_path_templates = {}
+
+
+def _compile_template(template):
+    """
+    Validates the `path_template` and returns its segments, with the variables
+    as `_PathVariable`s, e.g. "/asset/<int:asset_id>" to
+    `("", "asset", _PathVariable("asset_id", "int"))`
+    """
     template_segments = template.split("/")
-    for s in template_segments:
+    compiled = []
+    for i, s in enumerate(template_segments):
         if "<" in s or ">" in s:
             if not (s.startswith("<") and s.endswith(">")):
                 raise Exception(
                     f'Invalid `path_template`: "{template}"  Path segments with variables must be formatted as <variable_name>'
                 )
-            variable_name = s[1:-1]
+            converter, _, variable_name = s[1:-1].rpartition(":")
+            converter = converter or "string"
+            if converter not in _PATH_CONVERTERS:
+                raise Exception(
+                    f'Invalid `path_template`: "{template}"  Unknown converter `{converter}`, '
+                    f"expected one of {list(_PATH_CONVERTERS)}"
+                )
+            if converter == "path" and i != len(template_segments) - 1:
+                raise Exception(
+                    f'Invalid `path_template`: "{template}"  <path:{variable_name}> must be the last segment'
+                )
             if not variable_name.isidentifier() or iskeyword(variable_name):
                 warnings.warn(
                     f'`{variable_name}` is not a valid Python variable name in `path_template`: "{template}".',
                     stacklevel=2,
                 )
-    return template
+            compiled.append(_PathVariable(variable_name, converter))
+        else:
+            compiled.append(s)
+    return tuple(compiled)
+
+
+def _convert_segment(converter, segment):
+    """
+    Returns the converted path segment, or raises `ValueError`.
+    """
+    regex, to_python = _PATH_CONVERTERS[converter]
+    if regex is not None and not regex.fullmatch(segment):
+        raise ValueError(segment)
+    return to_python(segment)
 
 
 def _infer_path(filename, template):
@@ -284,41 +668,913 @@ def _infer_path(filename, template):
 
 
 def _import_layouts_from_pages(pages_folder):
-    for (root, dirs, files) in os.walk(pages_folder):
-        for file in files:
-            if file.endswith(".py") and not file.startswith("_"):
-                with open(os.path.join(root, file), encoding="utf-8") as f:
-                    content = f.read()
-                    if "register_page" not in content:
-                        continue
-            if file.startswith("_") or not file.endswith(".py"):
+    for entry in _discover_pages(pages_folder).values():
+        if not entry["registers_page"]:
+            continue
+        module_name = entry["module"]
+
+        if _config["lazy_import"]:
+            registration = entry.get("registration")
+            if registration is not None:
+                args, kwargs = registration
+                register_page(*args, **kwargs)
+                dash.page_registry[module_name]["layout"] = _LazyLayout(module_name)
                 continue
-            page_filename = os.path.join(root, file).replace("\\", "/")
-            _, _, page_filename = page_filename.partition("pages/")
-            page_filename = page_filename.replace(".py", "").replace("/", ".")
-            page_module = importlib.import_module(f"pages.{page_filename}")
-
-            if f"pages.{page_filename}" in dash.page_registry:
-                dash.page_registry[f"pages.{page_filename}"]["layout"] = getattr(
-                    page_module, "layout"
-                )
 
+        _import_page(module_name)
 
-def _path_to_page(app, path_id):
-    path_variables = None
+
+_MANIFEST_VERSION = 1
+
+
+def _manifest_path(pages_folder):
+    manifest = _config["manifest"]
+    if manifest is True:
+        return os.path.join(pages_folder, "_pages_manifest.json")
+    return manifest or None
+
+
+def _read_manifest(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != _MANIFEST_VERSION:
+        return None
+    return manifest["files"]
+
+
+def _write_manifest(path, files):
+    # A temporary file of its own, the workers of an app may write the manifest at once
+    with tempfile.NamedTemporaryFile(
+        "w",
+        encoding="utf-8",
+        dir=os.path.dirname(os.path.abspath(path)),
+        prefix=os.path.basename(path) + ".",
+        suffix=".tmp",
+        delete=False,
+    ) as f:
+        json.dump({"version": _MANIFEST_VERSION, "files": files}, f, indent=2)
+    try:
+        # Readable like a file written with `open`, not only by its owner
+        os.chmod(f.name, 0o644)
+        os.replace(f.name, path)
+    except OSError:
+        os.unlink(f.name)
+        raise
+
+
+def _scan_page_file(pages_folder, file, stat, previous, with_registration):
+    """
+    Returns the manifest entry of a module of the `pages` folder, reusing
+    the `previous` entry if the file didn't change.
+    """
+    if (
+        previous is not None
+        and previous["mtime_ns"] == stat.st_mtime_ns
+        and previous["size"] == stat.st_size
+    ):
+        return previous
+
+    with open(os.path.join(pages_folder, file), "rb") as f:
+        content = f.read()
+    sha256 = hashlib.sha256(content).hexdigest()
+    if previous is not None and previous["sha256"] == sha256:
+        return dict(previous, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+
+    module_name = "pages." + file[: -len(".py")].replace("/", ".")
+    content = content.decode("utf-8")
+    entry = dict(
+        file=file,
+        module=module_name,
+        mtime_ns=stat.st_mtime_ns,
+        size=stat.st_size,
+        sha256=sha256,
+        registers_page="register_page" in content,
+    )
+    if with_registration and entry["registers_page"]:
+        registration = _read_registration(content, module_name)
+        if registration is not None:
+            # Only keep the arguments that are the same once loaded from JSON
+            registration = list(registration)
+            if json.loads(json.dumps(registration, default=repr)) != registration:
+                registration = None
+        entry["registration"] = registration
+    return entry
+
+
+def _discover_pages(pages_folder, manifest_path=None, trust_manifest=None):
+    """
+    Returns the manifest entries of the modules in `pages_folder` by relative
+    path. With a manifest, unchanged modules are not read again and the
+    manifest is updated when modules changed.
+    """
+    if manifest_path is None:
+        manifest_path = _manifest_path(pages_folder)
+    if trust_manifest is None:
+        trust_manifest = _config["trust_manifest"]
+
+    previous_files = _read_manifest(manifest_path) if manifest_path else None
+    if trust_manifest:
+        if previous_files is not None:
+            return previous_files
+        warnings.warn(
+            f"The pages manifest `{manifest_path}` can't be read, the `pages` folder is scanned instead.",
+            stacklevel=2,
+        )
+
+    files = {}
+    for (root, dirs, filenames) in os.walk(pages_folder):
+        dirs.sort()
+        for filename in sorted(filenames):
+            if filename.startswith("_") or not filename.endswith(".py"):
+                continue
+            path = os.path.join(root, filename)
+            file = os.path.relpath(path, pages_folder).replace("\\", "/")
+            files[file] = _scan_page_file(
+                pages_folder,
+                file,
+                os.stat(path),
+                (previous_files or {}).get(file),
+                with_registration=bool(manifest_path) or _config["lazy_import"],
+            )
+
+    if manifest_path and files != previous_files:
+        try:
+            _write_manifest(manifest_path, files)
+        except OSError as err:
+            warnings.warn(
+                f"The pages manifest `{manifest_path}` can't be written: {err}",
+                stacklevel=2,
+            )
+    return files
+
+
+def build_manifest(pages_folder, manifest_path=None, app=None):
+    """
+    Writes the manifest of the modules in `pages_folder`, to be used with the
+    `manifest` and `trust_manifest` options. Also available from the command line
+    with `python -m dash_labs pages-manifest <app folder>`.
+
+    :param pages_folder: The `pages` folder of the app.
+    :param manifest_path: Default `pages/_pages_manifest.json`. Where to write the manifest.
+    :param app: Default None. The Dash app of the pages. When given, the skeletons of its page
+    layouts used for the `validation_layout` are saved in the manifest too, so that the app
+    doesn't render the layouts when it starts, e.g. with `trust_manifest`.
+    :return: The path of the manifest.
+    """
+    manifest_path = manifest_path or os.path.join(pages_folder, "_pages_manifest.json")
+    files = _discover_pages(pages_folder, manifest_path, trust_manifest=False)
+    if app is not None:
+        load_pages()
+        with app.server.test_request_context("/"):
+            _, manifest_changed = _page_skeletons(pages_folder, files)
+        if manifest_changed:
+            _write_manifest(manifest_path, files)
+    return manifest_path
+
+
+_import_locks = {}
+_import_locks_lock = threading.Lock()
+_importing = set()
+
+
+def _import_page(module_name):
+    """
+    Imports the page module and sets its `layout` in `dash.page_registry`.
+    A lazy page is only imported once, even when it is first visited by
+    concurrent requests.
+    """
+    with _import_locks_lock:
+        lock = _import_locks.setdefault(module_name, threading.Lock())
+
+    with lock:
+        page = dash.page_registry.get(module_name)
+        lazy = page is not None and isinstance(page.get("layout"), _LazyLayout)
+        if lazy:
+            _importing.add(module_name)
+        callbacks = len(_callback.GLOBAL_CALLBACK_LIST)
+        try:
+            page_module = importlib.import_module(module_name)
+        finally:
+            _importing.discard(module_name)
+        added = _callback.GLOBAL_CALLBACK_LIST[callbacks:]
+        if (
+            lazy
+            and added
+            and flask.has_app_context()
+            and flask.current_app._got_first_request
+        ):
+            # Dash collected the `dash.callback`s on the first request, these are never served
+            warnings.warn(
+                f"The lazy page {module_name} defined the callbacks "
+                f"{[c['output'] for c in added]} when it was first visited, after the app "
+                f"started, and they are ignored. Lazy pages must not import modules "
+                f"defining callbacks, import them in the app or call `load_pages()` "
+                f"before the first request."
+            )
+        # Only the callbacks defined in the page module itself, those of the modules
+        # it imports, e.g. a navbar shared by the pages, are callbacks of the app
+        outputs = {
+            c["output"] for c in added if _callback_module(c["output"]) == module_name
+        }
+        if outputs:
+            _page_callbacks[module_name] = outputs
+
+        if module_name in dash.page_registry:
+            dash.page_registry[module_name]["layout"] = getattr(page_module, "layout")
+            return dash.page_registry[module_name]["layout"]
+
+
+class _LazyLayout:
+    """
+    The `layout` of a page whose module isn't imported yet. Calling it
+    imports the module and calls or returns the module's `layout`.
+    """
+
+    def __init__(self, module):
+        self.module = module
+
+    def __call__(self, **kwargs):
+        page = dash.page_registry.get(self.module)
+        layout = page["layout"] if page is not None else self
+        if isinstance(layout, _LazyLayout):
+            layout = _import_page(self.module)
+        return layout(**kwargs) if callable(layout) else layout
+
+    def __repr__(self):
+        return f"<lazy layout of {self.module}>"
+
+
+def _callback_module(output):
+    # The callback functions are wrapped with `functools.wraps`, keeping `__module__`
+    func = _callback.GLOBAL_CALLBACK_MAP.get(output, {}).get("callback")
+    return getattr(func, "__module__", None)
+
+
+def load_pages(modules=None):
+    """
+    Imports the modules of the pages registered with the `lazy_import` option,
+    e.g. to warm up a worker before it serves requests.
+
+    :param modules: (string or list) Default None. The modules to import, all the lazy pages if None.
+    """
+    if isinstance(modules, str):
+        modules = [modules]
+    for page in list(dash.page_registry.values()):
+        if isinstance(page.get("layout"), _LazyLayout):
+            if modules is None or page["module"] in modules:
+                _import_page(page["module"])
+
+
+def warmup(app, path="/", freeze=True):
+    """
+    Builds the state the app otherwise builds on its first request: imports the lazy pages,
+    runs the `before_first_request` functions (the router and validation layout of the plugin,
+    the route index and the redirects, the callbacks of Dash) and the `before_request` functions
+    (e.g. the session bindings of `dash_labs.session`) for a request to `path`, serializes the
+    static layouts and compiles the index template.
+
+    Call it in the process that forks the workers, e.g. at the end of the app module loaded with
+    gunicorn's `--preload`, so that the workers share the built state instead of each building
+    it on its first request. With `dash_labs.session`, the request has no session cookie and
+    creates a session in the backend each time `warmup` is called.
+
+    :param app: The Dash app with the pages plugin.
+    :param path: (string) Default "/". Path of the request used to run the `before_request` functions.
+    :param freeze: (boolean) Default True. Moves the objects built so far to the permanent generation
+    of the garbage collector with `gc.freeze()`, so that the collections of the workers don't write
+    to the memory pages they share. Ignored before Python 3.7.
+    """
+    load_pages()
+    server = app.server
+    with server.test_request_context(path):
+        # Like Flask does on the first request
+        with server._before_request_lock:
+            if not server._got_first_request:
+                for func in server.before_first_request_funcs:
+                    server.ensure_sync(func)()
+                server._got_first_request = True
+        server.preprocess_request()
+
+    _get_route_cache()
+    _get_index_template()
+    if _config["serialize_static_layouts"]:
+        for page in dash.page_registry.values():
+            if page.get("layout") is not None and not callable(page["layout"]):
+                _serialized_layout(page)
+
+    if freeze and hasattr(gc, "freeze"):
+        gc.collect()
+        gc.freeze()
+
+
+def export_pages(app, output_folder, base_url="http://localhost"):
+    """
+    Writes the index HTML and the router callback response of the pages with a static
+    `layout`, `title` and `description` and no `path_template` to `output_folder`, to be
+    served by a CDN or a web server in front of the app. Also available from the command
+    line with `python -m dash_labs pages-export <module>:<app> <output folder>`. Layouts
+    holding `dash_labs.session` values differ for each session and are not exported.
+
+    The index of the page at `/about` is written to `about/index.html` and its router
+    response to `_pages_static/<module>.json`. The exported index HTML requests the router
+    response of the exported pages from these files instead of the router callback, the other
+    requests (assets, `_dash-layout`, `_dash-dependencies`, callbacks) are still served by the app.
+
+    :param app: The Dash app with the pages plugin.
+    :param output_folder: The folder to write the files to.
+    :param base_url: (string) Default "http://localhost". Scheme and host of the URLs of the
+    exported pages, used in their meta tags.
+    :return: The paths of the written files.
+    """
+    warmup(app, freeze=False)
+    client = app.server.test_client()
+    routes_prefix = app.config.routes_pathname_prefix.rstrip("/")
+    output = f"..{_ID_CONTENT}.children...{_ID_STORE}.data.."
+
+    exported = {}
     for page in dash.page_registry.values():
-        if page["path_template"]:
-            template_id = page["path_template"].strip("/")
-            path_variables = _parse_path_variables(path_id, template_id)
-            if path_variables:
-                return page, path_variables
-        if path_id == page["path"].strip("/"):
-            return page, path_variables
-    return {}, None
+        if (
+            page["path_template"]
+            or page["module"] == "pages.not_found_404"
+            or callable(page.get("layout"))
+            or callable(page["title"])
+            or callable(page["description"])
+            or _has_session_values(page.get("layout"))
+            or (_config["page_callbacks"] and page["module"] in _page_callbacks)
+        ):
+            continue
+        response = client.post(
+            f"{routes_prefix}/_dash-update-component",
+            json={
+                "output": output,
+                "outputs": [
+                    {"id": _ID_CONTENT, "property": "children"},
+                    {"id": _ID_STORE, "property": "data"},
+                ],
+                "inputs": [
+                    {
+                        "id": _ID_LOCATION,
+                        "property": "pathname",
+                        "value": app.get_relative_path(page["path"]),
+                    },
+                    {"id": _ID_LOCATION, "property": "search", "value": ""},
+                ],
+                "changedPropIds": [f"{_ID_LOCATION}.pathname"],
+                "state": [],
+            },
+        )
+        if response.status_code != 200:
+            raise Exception(
+                f"The router callback of {page['module']} answered {response.status}"
+            )
+        exported[page["module"]] = response.get_data()
+
+    script = _static_pages_script(app, exported)
+    files = []
+    for module, data in exported.items():
+        page = dash.page_registry[module]
+        response = client.get(routes_prefix + page["path"], base_url=base_url)
+        if response.status_code != 200:
+            raise Exception(f"The index of {module} answered {response.status}")
+        index = response.get_data(as_text=True).replace(
+            "<footer>", f"<footer>{script}", 1
+        )
+        path = page["path"].strip("/")
+        files.append(
+            _write_export(output_folder, path, "index.html", index.encode("utf-8"))
+        )
+        files.append(
+            _write_export(output_folder, "_pages_static", f"{module}.json", data)
+        )
+    return files
+
+
+def _write_export(output_folder, folder, filename, data):
+    folder = os.path.join(output_folder, *folder.split("/"))
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, filename)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+# Requests the router response of the exported pages from their JSON file.
+_STATIC_PAGES_SCRIPT = """
+(function (options) {
+    var nativeFetch = window.fetch.bind(window);
+
+    window.fetch = function (url, init) {
+        if (init && init.method === "POST" && typeof init.body === "string" &&
+            String(url).indexOf(options.url) !== -1 &&
+            init.body.indexOf(options.output) !== -1) {
+            var body = JSON.parse(init.body);
+            var inputs = {};
+            body.inputs.forEach(function (input) {
+                inputs[input.property] = input.value;
+            });
+            var pathname = (inputs.pathname || "").replace(/(.)\\/$/, "$1");
+            if (body.output === options.output && !inputs.search &&
+                    options.pages.hasOwnProperty(pathname)) {
+                return nativeFetch(options.pages[pathname]);
+            }
+        }
+        return nativeFetch(url, init);
+    };
+})(%s);
+"""
+
+
+def _static_pages_script(app, modules):
+    """
+    Returns the script of the exported index pages, answering the router callback of
+    the exported `modules` with their JSON file.
+    """
+    options = dict(
+        url=app.get_relative_path("/_dash-update-component"),
+        output=f"..{_ID_CONTENT}.children...{_ID_STORE}.data..",
+        pages={
+            app.get_relative_path(
+                dash.page_registry[module]["path"]
+            ): app.get_relative_path(f"/_pages_static/{module}.json")
+            for module in modules
+        },
+    )
+    options = json.dumps(options).replace("</", "<\\/")
+    return f"<script>{_STATIC_PAGES_SCRIPT % options}</script>"
+
+
+# Calls that make a page module unsuitable for lazy imports
+_callback_names = {"callback", "clientside_callback", "long_callback"}
+
+
+def _call_name(func):
+    if isinstance(func, ast.Name):
+        return func.id
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    return None
+
+
+def _read_registration(source, module_name):
+    """
+    Reads the arguments of the `register_page(__name__, ...)` call of a page
+    module without importing it. Returns `(args, kwargs)`, or `None` when the
+    module must be imported: the arguments are not all literals, there is not
+    exactly one top level `register_page` call or the module defines callbacks.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return None
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and _call_name(node.func) in _callback_names:
+            return None
+
+    calls = [
+        node.value
+        for node in tree.body
+        if isinstance(node, ast.Expr)
+        and isinstance(node.value, ast.Call)
+        and _call_name(node.value.func) == "register_page"
+    ]
+    if len(calls) != 1:
+        return None
+    call = calls[0]
+
+    def literal(node):
+        if isinstance(node, ast.Name) and node.id == "__name__":
+            return module_name
+        return ast.literal_eval(node)
+
+    try:
+        args = [literal(arg) for arg in call.args]
+        kwargs = {}
+        for keyword in call.keywords:
+            if keyword.arg is None:
+                return None
+            kwargs[keyword.arg] = literal(keyword.value)
+        bound = inspect.signature(register_page).bind(*args, **kwargs)
+    except (ValueError, TypeError, SyntaxError):
+        return None
+
+    if bound.arguments["module"] != module_name:
+        return None
+    return args, kwargs
+
+
+class _RouteNode:
+    """
+    A node of the path segment trie used by `_RouteIndex`.
+
+    Literal segments are looked up by value in `literals` and variables by
+    converter name in `variables`. `pages` holds the templates ending at this
+    node and `tails` the templates ending with a `<path:...>` variable here.
+    """
+
+    __slots__ = ("literals", "variables", "pages", "tails")
+
+    def __init__(self):
+        self.literals = {}
+        self.variables = {}
+        self.pages = []
+        self.tails = []
+
+
+class _RouteIndex:
+    """
+    Compiled routing structure for `dash.page_registry`.
+
+    Static paths are stored in a hash map and `path_template`s in a segment
+    trie so that resolving a pathname does not depend on the number of pages.
+    Each page keeps its position in `dash.page_registry` so that, as with a
+    linear scan of the registry, the first matching page wins.
+    """
+
+    def __init__(self, pages):
+        self.static = {}
+        self.root = _RouteNode()
+        for position, page in enumerate(pages):
+            # The `path` inferred from a `path_template` holds "none" for its variables,
+            # which may not convert, it is only matched through the template. A template
+            # without variables is the same as its `path`.
+            if (
+                not page["path_template"]
+                or page.get("supplied_path") is not None
+                or not _has_path_variables(page)
+            ):
+                self.static.setdefault(page["path"].strip("/"), (position, page))
+            if page["path_template"]:
+                self._add_template(position, page)
+
+    def _add_template(self, position, page):
+        segments = _path_templates.get(page["module"])
+        if segments is None:
+            segments = _compile_template(page["path_template"])
+        # Drop the leading and trailing slashes, like `path_template.strip("/")`
+        while segments and segments[0] == "":
+            segments = segments[1:]
+        while segments and segments[-1] == "":
+            segments = segments[:-1]
+
+        node = self.root
+        variables = []
+        for i, segment in enumerate(segments):
+            if isinstance(segment, _PathVariable):
+                if segment.converter == "path":
+                    node.tails.append((position, page, variables, segment.name))
+                    return
+                variables.append((i, segment.name))
+                node = node.variables.setdefault(segment.converter, _RouteNode())
+            else:
+                node = node.literals.setdefault(segment, _RouteNode())
+        if variables:
+            # A template without variables is only ever matched by its `path`
+            node.pages.append((position, page, variables))
+
+    def match(self, path_id):
+        """
+        Return `(page, path_variables)` for the pathname, or `({}, None)`.
+        """
+        static = self.static.get(path_id)
+        segments = path_id.split("/")
+        best = _match_segments(self.root, segments, 0, [None] * len(segments), None)
+        if best is None or (static is not None and static[0] < best[0]):
+            if static is None:
+                return {}, None
+            return static[1], None
+        position, page, path_variables = best
+        return page, path_variables
+
+
+def _has_path_variables(page):
+    segments = _path_templates.get(page["module"])
+    if segments is None:
+        segments = _compile_template(page["path_template"])
+    return any(isinstance(s, _PathVariable) for s in segments)
+
+
+def _match_segments(node, segments, depth, values, best):
+    """
+    Depth first search of the route trie. `values` holds the converted
+    variables of the segments matched so far. Returns the match with the
+    lowest registry position as a `(position, page, path_variables)` tuple.
+    """
+    if node.tails and depth < len(segments):
+        if best is None or node.tails[0][0] < best[0]:
+            position, page, variables, name = node.tails[0]
+            path_variables = {n: values[i] for i, n in variables}
+            path_variables[name] = "/".join(segments[depth:])
+            best = (position, page, path_variables)
+    if depth == len(segments):
+        if node.pages and (best is None or node.pages[0][0] < best[0]):
+            position, page, variables = node.pages[0]
+            best = (position, page, {n: values[i] for i, n in variables})
+        return best
+    segment = segments[depth]
+    child = node.literals.get(segment)
+    if child is not None:
+        best = _match_segments(child, segments, depth + 1, values, best)
+    for converter, child in node.variables.items():
+        try:
+            values[depth] = _convert_segment(converter, segment)
+        except ValueError:
+            continue
+        best = _match_segments(child, segments, depth + 1, values, best)
+    return best
+
+
+_route_index = None
+_route_cache = None
+
+
+def _invalidate_routes():
+    global _route_index, _route_cache
+    _route_index = None
+    _route_cache = None
+    _clear_index_cache()
+
+
+def _get_route_index():
+    global _route_index
+    if _route_index is None:
+        _route_index = _RouteIndex(dash.page_registry.values())
+    return _route_index
+
+
+def _resolve_route(path_id):
+    return _get_route_index().match(path_id)
+
+
+def _get_route_cache():
+    global _route_cache
+    if _route_cache is None:
+        _route_cache = functools.lru_cache(maxsize=_config["route_cache_size"])(
+            _resolve_route
+        )
+    return _route_cache
+
+
+def route_cache_info():
+    """
+    Returns the `hits`, `misses`, `maxsize` and `currsize` of the LRU cache
+    in front of the route resolution, like `functools.lru_cache`'s `cache_info`.
+    The cache and its counters are reset whenever a page is registered.
+    """
+    return _get_route_cache().cache_info()
+
+
+def _path_to_page(app, path_id):
+    # The returned page and path variables are shared by all the hits of
+    # the cache and must not be modified.
+    return _get_route_cache()(path_id)
+
+
+# Routing metrics, gathered when the `metrics_path` option is set
+_metrics = Metrics("dash_pages")
+_metrics.histogram(
+    "phase_seconds",
+    "Seconds spent resolving the pathname, rendering the layout, the title and "
+    "the meta tags and the index of a page.",
+    ("page", "phase"),
+)
+_metrics.histogram(
+    "response_seconds",
+    "Seconds to answer the router callback, serialization included.",
+    ("page",),
+)
+_metrics.histogram(
+    "response_bytes",
+    "Size of the router callback responses.",
+    ("page",),
+    BYTES_BUCKETS,
+)
+_metrics.counter(
+    "layout_cache_total",
+    "Layout cache lookups by result: hit, miss or coalesced with a render in progress.",
+    ("page", "result"),
+)
+_metrics.counter(
+    "index_cache_total", "Index HTML cache lookups by result.", ("result",)
+)
+_metrics.counter("not_found_total", "Pathnames that don't match a page.", ())
+_metrics.counter("route_cache_hits_total", "Route cache hits.", ())
+_metrics.counter("route_cache_misses_total", "Route cache misses.", ())
+
+
+class _PhaseTimer:
+    """
+    Times the successive phases of a request, recorded in the metrics.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.last = time.perf_counter()
+        self.phases = []
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def record(self, page):
+        for phase, seconds in self.phases:
+            _metrics.observe("phase_seconds", (page, phase), seconds)
+
+
+class _NoPhaseTimer:
+    enabled = False
+
+    def lap(self, phase):
+        pass
+
+    def record(self, page):
+        pass
+
+
+_NO_PHASE_TIMER = _NoPhaseTimer()
+
+
+def _phase_timer():
+    return _NO_PHASE_TIMER if _config["metrics_path"] is None else _PhaseTimer()
+
+
+def _count_layout_cache(page, result):
+    if _config["metrics_path"] is not None:
+        _metrics.inc("layout_cache_total", (page["module"], result))
+
+
+def _record_response(page, start):
+    @flask.after_this_request
+    def record(response):
+        _metrics.observe("response_seconds", (page,), time.perf_counter() - start)
+        _metrics.observe("response_bytes", (page,), response.content_length or 0)
+        return response
+
+
+def _serve_metrics():
+    info = route_cache_info()
+    _metrics.set("route_cache_hits_total", (), info.hits)
+    _metrics.set("route_cache_misses_total", (), info.misses)
+    return flask.Response(_metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+def _route(app, pathname, search, compress=True):
+    """
+    Returns the page at `pathname`, or the 404 page, with its layout and title.
+    """
+    timer = _phase_timer()
+    page, path_variables = _path_to_page(app, app.strip_relative_path(pathname))
+    timer.lap("resolve")
+    if page == {} and timer.enabled:
+        _metrics.inc("not_found_total", ())
+
+    # get layout
+    if page == {}:
+        if "pages.not_found_404" in dash.page_registry:
+            page = dash.page_registry["pages.not_found_404"]
+            layout = page["layout"]
+            title = page["title"]
+        else:
+            layout = html.H1("404")
+            title = app.title
+    else:
+        layout = page["layout"]
+        title = page["title"]
+
+    if callable(layout):
+        query_parameters = _parse_query_string(
+            search, _query_schemas.get(page.get("module"))
+        )
+        layout = _render_layout(page, layout, path_variables, query_parameters)
+        if isinstance(layout, _SerializedLayout):
+            layout = _serialized_layout_placeholder(layout.data)
+    elif page and _config["serialize_static_layouts"]:
+        serialized = _serialized_layout(page)
+        if serialized is not None:
+            compress = (
+                compress and _config["compress_static_layouts"] and not callable(title)
+            )
+            layout = _serialized_layout_placeholder(
+                serialized, compress_module=page["module"] if compress else None
+            )
+    timer.lap("layout")
+    if callable(title):
+        title = _evaluate_meta(page, dict(title=title), path_variables)["title"]
+        timer.lap("title")
+    if page.get("client_cache"):
+        flask.after_this_request(_mark_client_cacheable)
+    timer.record(page.get("module", "404"))
+
+    return page, layout, title
+
+
+def _evaluate_meta(page, values, path_variables):
+    """
+    Returns the `values` of the `title` and `description` of the page with their
+    functions called, through the page's `meta_cache` when it has one. The `async def`
+    functions are awaited together.
+    """
+    cache = page.get("meta_cache")
+    calls = {}
+    values = dict(values)
+    for name, value in values.items():
+        if not callable(value):
+            continue
+        key = json.dumps(
+            [page.get("module"), name, path_variables or {}],
+            sort_keys=True,
+            default=str,
+        )
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not LayoutCache.undefined:
+                values[name] = cached
+                continue
+        calls[name] = (key, value(**path_variables) if path_variables else value())
+
+    resolved = _resolve(*(result for _, result in calls.values()))
+    for (name, (key, _)), value in zip(calls.items(), resolved):
+        values[name] = value
+        if cache is not None:
+            cache.set(key, value)
+    return values
+
+
+def _mark_client_cacheable(response):
+    response.headers[_CLIENT_CACHE_HEADER] = "1"
+    return response
+
+
+def _replace_props(component, props_by_id):
+    """
+    Returns the layout with the props of the components with the given ids replaced.
+    The components on the way to them are copied, the layout isn't changed in place
+    since it is shared by the requests.
+    """
+    if isinstance(component, (list, tuple)):
+        children = [_replace_props(child, props_by_id) for child in component]
+        if all(new is old for new, old in zip(children, component)):
+            return component
+        return children
+    if not isinstance(component, Component):
+        return component
+
+    component_id = getattr(component, "id", None)
+    props = props_by_id.get(component_id) if isinstance(component_id, str) else None
+    children = getattr(component, "children", None)
+    new_children = _replace_props(children, props_by_id)
+    if props is None and new_children is children:
+        return component
+
+    component = copy.copy(component)
+    if new_children is not children:
+        component.children = new_children
+    for name, value in (props or {}).items():
+        setattr(component, name, value)
+    return component
+
+
+def _prerender_layout(app, layout):
+    """
+    Fills the page container of the app layout with the page the browser is loading,
+    found from the Referer header of the `_dash-layout` request. `dcc.Location` then
+    already has the browser's pathname and search, and doesn't trigger the router.
+    """
+    referrer = urlparse(flask.request.referrer or "")
+    if referrer.netloc != flask.request.host:
+        return layout
+    search = f"?{referrer.query}" if referrer.query else ""
+    _, content, title = _route(app, referrer.path, search, compress=False)
+    return _replace_props(
+        layout,
+        {
+            _ID_LOCATION: dict(
+                pathname=referrer.path, search=search, href=flask.request.referrer
+            ),
+            _ID_CONTENT: dict(children=content),
+            _ID_STORE: dict(data={"title": title}),
+        },
+    )
 
 
 def plug(app):
-    dash.page_registry = OrderedDict()
+    global _assets_index, _redirects
+
+    dash.page_registry = _PageRegistry()
+    _assets_index = _AssetsIndex(app.config.assets_folder)
+    _path_templates.clear()
+    _query_schemas.clear()
+    _serialized_layouts.clear()
+    _compressed_responses.clear()
+    _invalidate_routes()
+    _redirects = None
+    _metrics.clear()
+    _page_callbacks.clear()
 
     pages_folder = os.path.join(flask.helpers.get_root_path(app.config.name), "pages")
     if os.path.exists(pages_folder):
@@ -326,6 +1582,41 @@ def plug(app):
     else:
         warnings.warn("A folder called `pages` does not exist.", stacklevel=2)
 
+    if _config["prerender_layout"]:
+
+        def serve_layout():
+            # Replaces `Dash.serve_layout` before `init_app` adds the `_dash-layout` route
+            layout = _prerender_layout(app, app._layout_value())
+            return flask.Response(
+                json.dumps(layout, cls=PlotlyJSONEncoder),
+                mimetype="application/json",
+            )
+
+        app.serve_layout = serve_layout
+
+    if _config["page_callbacks"]:
+
+        def dependencies():
+            # Replaces `Dash.dependencies` before `init_app` adds the `_dash-dependencies` route
+            loaded = _loaded_page_callbacks()
+            # The page being loaded, sent by the script rather than read from the
+            # Referer, which the Referrer-Policy of the app or of a proxy may drop
+            pathname = flask.request.headers.get(_PATHNAME_HEADER)
+            if pathname:
+                loaded.add(_page_module(app, pathname))
+            loaded &= _page_callbacks.keys()
+            hidden = set()
+            for module, outputs in _page_callbacks.items():
+                if module not in loaded:
+                    hidden |= outputs
+            response = flask.jsonify(
+                [c for c in app._callback_list if c["output"] not in hidden]
+            )
+            response.headers[_PAGE_CALLBACKS_HEADER] = ",".join(sorted(loaded))
+            return response
+
+        app.dependencies = dependencies
+
     @app.server.before_first_request
     def router():
         @callback(
@@ -338,31 +1629,16 @@ def plug(app):
         def update(pathname, search):
             # updates layout on page navigation
             # updates the stored page title which will trigger the clientside callback to update the app title
-
-            query_parameters = _parse_query_string(search)
-            page, path_variables = _path_to_page(app, app.strip_relative_path(pathname))
-
-            # get layout
-            if page == {}:
-                if "pages.not_found_404" in dash.page_registry:
-                    layout = dash.page_registry["pages.not_found_404"]["layout"]
-                    title = dash.page_registry["pages.not_found_404"]["title"]
-                else:
-                    layout = html.H1("404")
-                    title = app.title
-            else:
-                layout = page["layout"]
-                title = page["title"]
-
-            if callable(layout):
-                layout = (
-                    layout(**path_variables, **query_parameters)
-                    if path_variables
-                    else layout(**query_parameters)
-                )
-            if callable(title):
-                title = title(**path_variables) if path_variables else title()
-
+            start = time.perf_counter()
+            if _config["page_callbacks"]:
+                module = _page_module(app, pathname)
+                if module in _page_callbacks and module not in _loaded_page_callbacks():
+                    # The browser doesn't have the callbacks of the page, it reloads the app
+                    flask.after_this_request(_reload_app)
+                    return dash.no_update, dash.no_update
+            page, layout, title = _route(app, pathname, search)
+            if _config["metrics_path"] is not None:
+                _record_response(page.get("module", "404"), start)
             return layout, {"title": title}
 
         # check for duplicate pathnames
@@ -377,14 +1653,13 @@ def plug(app):
             if len(modules) > 1:
                 raise Exception(f"modules {modules} have duplicate paths")
 
+        # Compile the routes now that the registry is complete
+        _get_route_index()
+
         # Set validation_layout
-        app.validation_layout = html.Div(
-            [
-                page["layout"]() if callable(page["layout"]) else page["layout"]
-                for page in dash.page_registry.values()
-            ]
-            + [app.layout() if callable(app.layout) else app.layout]
-        )
+        app.validation_layout = _validation_layout(app, pages_folder)
+
+        pages_scripts = _client_cache_script(app) + _page_callbacks_script(app)
 
         # Update the page title on page navigation
         app.clientside_callback(
@@ -407,6 +1682,9 @@ def plug(app):
             )
 
             image = start_page.get("image", "")
+            if start_page and start_page["supplied_image"] is None and app.server.debug:
+                # Pick up the images added to the assets folder while debugging
+                image = _infer_image(start_page["module"], refresh=True)
             if image:
                 image = app.get_asset_url(image)
             assets_image_url = (
@@ -417,85 +1695,973 @@ def plug(app):
             image_url = supplied_image_url if supplied_image_url else assets_image_url
 
             title = start_page.get("title", app.title)
-            if callable(title):
-                title = title(**path_variables) if path_variables else title()
-
             description = start_page.get("description", "")
-            if callable(description):
-                description = (
-                    description(**path_variables) if path_variables else description()
+            cacheable = not callable(title) and not callable(description)
+            if cacheable:
+                key = (
+                    start_page.get("module"),
+                    flask.request.url,
+                    title,
+                    description,
+                    image_url,
+                    tuple(sorted(kwargs.items())),
                 )
-
-            return dedent(
-                """
-                <!DOCTYPE html>
-                <html>
-                    <head>
-                        <meta name="viewport" content="width=device-width, initial-scale=1">
-                        <title>{title}</title>
-                        <meta name="description" content="{description}" />
-                        <!-- Twitter Card data -->
-                        <meta property="twitter:card" content="summary_large_image">
-                        <meta property="twitter:url" content="{url}">
-                        <meta property="twitter:title" content="{title}">
-                        <meta property="twitter:description" content="{description}">
-                        <meta property="twitter:image" content="{image}">
-                        <!-- Open Graph data -->
-                        <meta property="og:title" content="{title}" />
-                        <meta property="og:type" content="website" />
-                        <meta property="og:description" content="{description}" />       
-                        <meta property="og:image" content="{image}">
-                        {metas}
-                        {favicon}
-                        {css}
-                    </head>
-                    <body>
-                        {app_entry}
-                        <footer>
-                            {config}
-                            {scripts}
-                            {renderer}
-                        </footer>
-                    </body>
-                </html>
-                """
-            ).format(
-                metas=kwargs["metas"],
-                description=description,
-                url=flask.request.url,
-                title=title,
-                image=image_url,
-                favicon=kwargs["favicon"],
-                css=kwargs["css"],
-                app_entry=kwargs["app_entry"],
-                config=kwargs["config"],
-                scripts=kwargs["scripts"],
-                renderer=kwargs["renderer"],
+                with _index_cache_lock:
+                    cached = _index_cache.get(key)
+                    if cached is not None:
+                        _index_cache.move_to_end(key)
+                if _config["metrics_path"] is not None:
+                    _metrics.inc("index_cache_total", ("hit" if cached else "miss",))
+                if cached is not None:
+                    index, etag = cached
+                    _set_index_validators(start_page, etag, cacheable)
+                    return index
+
+            timer = _phase_timer()
+            meta = _evaluate_meta(
+                start_page,
+                dict(title=title, description=description),
+                path_variables,
+            )
+            title, description = meta["title"], meta["description"]
+            timer.lap("meta")
+
+            index = _render_index(
+                _get_index_template(),
+                dict(
+                    kwargs,
+                    pages_scripts=pages_scripts,
+                    description=description,
+                    url=flask.request.url,
+                    title=title,
+                    image=image_url,
+                ),
             )
+            etag = hashlib.sha1(index.encode("utf-8")).hexdigest()
+            timer.lap("index")
+            timer.record(start_page.get("module", "404"))
+            if cacheable and _config["index_cache_size"]:
+                with _index_cache_lock:
+                    _index_cache[key] = (index, etag)
+                    while len(_index_cache) > _config["index_cache_size"]:
+                        _index_cache.popitem(last=False)
+            _set_index_validators(start_page, etag, cacheable)
+            return index
 
         app.interpolate_index = interpolate_index
 
-        def create_redirect_function(redirect_to):
-            def redirect():
-                return flask.redirect(redirect_to, code=301)
+        # Compile the redirects, checked by `redirect` before each request
+        global _redirects
+        _redirects = _RedirectTable(dash.page_registry.values())
+
+    if _config["metrics_path"] is not None:
+        app.server.add_url_rule(
+            app.config.routes_pathname_prefix + _config["metrics_path"].lstrip("/"),
+            "dash_pages_metrics",
+            _serve_metrics,
+        )
+
+    @app.server.before_request
+    def redirect():
+        if _redirects is None or flask.request.method not in ("GET", "HEAD"):
+            return None
+        # Only the paths served by the index, the routes of Dash and of the other
+        # views of the server win over the `redirect_from` templates
+        if app.server.view_functions.get(flask.request.endpoint) != app.index:
+            return None
+        # Only the paths under the app's routes prefix, without the prefix
+        prefix = app.config.routes_pathname_prefix
+        path = flask.request.path
+        if not (path + "/").startswith(prefix):
+            return None
+        match = _redirects.match(path[len(prefix) :].strip("/"))
+        if match is None:
+            return None
+        location, status = match
+        location = app.get_relative_path(location)
+        if flask.request.query_string:
+            location += "?" + flask.request.query_string.decode("latin-1")
+        return flask.redirect(location, code=status)
+
 
-            return redirect
+_REDIRECT_STATUSES = (301, 302, 303, 307, 308)
 
-        # Set redirects
-        for module in dash.page_registry:
-            page = dash.page_registry[module]
-            if page["redirect_from"] and len(page["redirect_from"]):
-                for redirect in page["redirect_from"]:
-                    fullname = app.get_relative_path(redirect)
-                    app.server.add_url_rule(
-                        fullname, fullname, create_redirect_function(page["path"])
+
+class _RedirectTable:
+    """
+    The `redirect_from` paths of the pages, compiled into a single lookup table.
+
+    Static paths are found in a hash map and templates in a route trie, like
+    the pages in `_RouteIndex`. The variables of a template are carried to the
+    `path_template` of the page it redirects to.
+    """
+
+    def __init__(self, pages):
+        redirects = []
+        for page in pages:
+            for source in page["redirect_from"] or []:
+                template = source if "<" in source else None
+                target = _compile_template(page["path_template"] or page["path"])
+                if template is not None:
+                    names = {
+                        s.name
+                        for s in _compile_template(template)
+                        if isinstance(s, _PathVariable)
+                    }
+                    missing = [
+                        s.name
+                        for s in target
+                        if isinstance(s, _PathVariable) and s.name not in names
+                    ]
+                    if missing:
+                        raise Exception(
+                            f'`redirect_from` "{source}" of {page["module"]} is missing the '
+                            f"variables {missing} of its `path_template`"
+                        )
+                elif page["path_template"]:
+                    target = _compile_template(page["path"])
+                redirects.append(
+                    dict(
+                        module=f"redirect_from {source}",
+                        path=source,
+                        path_template=template,
+                        target=target,
+                        status=page["redirect_status"],
                     )
+                )
+        self.size = len(redirects)
+        self.index = _RouteIndex(redirects)
+
+    def match(self, path_id):
+        """
+        Returns `(location, status)` of the redirect of the pathname, or None.
+        """
+        if not self.size:
+            return None
+        redirect, path_variables = self.index.match(path_id)
+        if not redirect:
+            return None
+        if path_variables and "" in path_variables.values():
+            # A variable only redirects a segment that isn't empty, e.g. not "/"
+            return None
+        location = "/".join(
+            str(path_variables[s.name]) if isinstance(s, _PathVariable) else s
+            for s in redirect["target"]
+        )
+        return location, redirect["status"]
+
+
+# Compiled `redirect_from` of the registered pages, set on the first request
+_redirects = None
+
+
+_INDEX_TEMPLATE = dedent(
+    """
+    <!DOCTYPE html>
+    <html>
+        <head>
+            <meta name="viewport" content="width=device-width, initial-scale=1">
+            <title>{title}</title>
+            <meta name="description" content="{description}" />
+            <!-- Twitter Card data -->
+            <meta property="twitter:card" content="summary_large_image">
+            <meta property="twitter:url" content="{url}">
+            <meta property="twitter:title" content="{title}">
+            <meta property="twitter:description" content="{description}">
+            <meta property="twitter:image" content="{image}">
+            <!-- Open Graph data -->
+            <meta property="og:title" content="{title}" />
+            <meta property="og:type" content="website" />
+            <meta property="og:description" content="{description}" />       
+            <meta property="og:image" content="{image}">
+            {metas}
+            {favicon}
+            {css}
+        </head>
+        <body>
+            {app_entry}
+            <footer>
+                {pages_scripts}
+                {config}
+                {scripts}
+                {renderer}
+            </footer>
+        </body>
+    </html>
+    """
+)
+
+# Compiled index template, and the rendered index HTML and its ETag of the routes
+# with a static title and description, by page, URL, image and Dash renderer kwargs
+_index_template = None
+_index_modified = None
+_index_cache = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+
+def _compile_index_template(template, minify=False):
+    """
+    Splits the index template into its literal text and field names, once.
+    The literal text is stripped of its indentation and line breaks with `minify`.
+    """
+    if minify:
+        template = "".join(line.strip() for line in template.splitlines())
+    return [
+        (literal, field) for literal, field, _, _ in string.Formatter().parse(template)
+    ]
+
+
+def _get_index_template():
+    global _index_template
+    if _index_template is None:
+        _index_template = _compile_index_template(
+            _INDEX_TEMPLATE, minify=_config["minify_index"]
+        )
+    return _index_template
+
+
+_CLIENT_CACHE_HEADER = "X-Dash-Pages-Cacheable"
+
+# Wraps `window.fetch` to answer the router callback requests from a bounded cache
+# of the responses marked cacheable, and prefetches the linked cacheable pages.
+_CLIENT_CACHE_SCRIPT = """
+(function (options) {
+    var cache = new Map();
+    var pending = new Map();
+    var nativeFetch = window.fetch.bind(window);
+
+    function cacheKey(pathname, search) {
+        return pathname + "\\n" + (search || "");
+    }
+
+    function routerKey(url, init) {
+        if (!init || init.method !== "POST" || typeof init.body !== "string" ||
+            String(url).indexOf(options.url) === -1 ||
+            init.body.indexOf(options.output) === -1) {
+            return null;
+        }
+        var body = JSON.parse(init.body);
+        if (body.output !== options.output) {
+            return null;
+        }
+        var inputs = {};
+        body.inputs.forEach(function (input) {
+            inputs[input.property] = input.value;
+        });
+        return cacheKey(inputs.pathname, inputs.search);
+    }
+
+    function remember(key, text) {
+        cache.delete(key);
+        cache.set(key, text);
+        while (cache.size > options.size) {
+            cache.delete(cache.keys().next().value);
+        }
+    }
+
+    function store(key, response) {
+        if (response.status !== 200 || !response.headers.get(options.header)) {
+            return Promise.resolve(response);
+        }
+        return response.clone().text().then(function (text) {
+            remember(key, text);
+            return response;
+        });
+    }
+
+    function cached(text) {
+        return new Response(text, {
+            status: 200, headers: {"Content-Type": "application/json"}
+        });
+    }
+
+    window.fetch = function (url, init) {
+        var key = routerKey(url, init);
+        if (key === null) {
+            return nativeFetch(url, init);
+        }
+        if (cache.has(key)) {
+            var text = cache.get(key);
+            remember(key, text);
+            return Promise.resolve(cached(text));
+        }
+        if (pending.has(key)) {
+            return pending.get(key).then(function (response) {
+                return response.clone();
+            });
+        }
+        return nativeFetch(url, init).then(function (response) {
+            return store(key, response);
+        });
+    };
+
+    function prefetch(link) {
+        if (link.origin !== window.location.origin ||
+            options.paths.indexOf(link.pathname) === -1) {
+            return;
+        }
+        var key = cacheKey(link.pathname, link.search);
+        if (cache.has(key) || pending.has(key)) {
+            return;
+        }
+        var headers = {"Content-Type": "application/json"};
+        var csrf = document.cookie.match(/(?:^|;\\s*)_csrf_token=([^;]*)/);
+        if (csrf) {
+            headers["X-CSRFToken"] = csrf[1];
+        }
+        var request = nativeFetch(options.url, {
+            method: "POST",
+            credentials: "same-origin",
+            headers: headers,
+            body: JSON.stringify({
+                output: options.output,
+                outputs: options.outputs,
+                inputs: [
+                    {id: options.location, property: "pathname", value: link.pathname},
+                    {id: options.location, property: "search", value: link.search}
+                ],
+                changedPropIds: [options.location + ".pathname"],
+                state: []
+            })
+        }).then(function (response) {
+            return store(key, response);
+        });
+        pending.set(key, request);
+        request.then(function () {
+            pending.delete(key);
+        }, function () {
+            pending.delete(key);
+        });
+    }
+
+    if (!options.prefetch) {
+        return;
+    }
+    document.addEventListener("mouseover", function (event) {
+        var link = event.target.closest && event.target.closest("a[href]");
+        if (link) {
+            prefetch(link);
+        }
+    }, {passive: true});
+
+    if (options.prefetch !== "viewport" || !window.IntersectionObserver) {
+        return;
+    }
+    var observed = new WeakSet();
+    var viewport = new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+            if (entry.isIntersecting) {
+                viewport.unobserve(entry.target);
+                prefetch(entry.target);
+            }
+        });
+    });
+    new MutationObserver(function () {
+        document.querySelectorAll("a[href]").forEach(function (link) {
+            if (!observed.has(link)) {
+                observed.add(link);
+                viewport.observe(link);
+            }
+        });
+    }).observe(document.body, {childList: true, subtree: true});
+})(%s);
+"""
+
+
+_PAGE_CALLBACKS_HEADER = "X-Dash-Pages-Callbacks"
+_RELOAD_HEADER = "X-Dash-Pages-Reload"
+_PATHNAME_HEADER = "X-Dash-Pages-Pathname"
+
+# Callback outputs of the page modules that define callbacks, by module
+_page_callbacks = {}
+
+# Sends the pages whose callbacks the app has with the requests of the callbacks
+# and of the router, and reloads the app when the router asks for it.
+_PAGE_CALLBACKS_SCRIPT = """
+(function (options) {
+    var key = "dash-pages-callbacks";
+    var loaded = JSON.parse(window.sessionStorage.getItem(key) || "[]");
+    var nativeFetch = window.fetch.bind(window);
+
+    window.fetch = function (url, init) {
+        var dependencies = String(url).indexOf(options.dependencies) !== -1;
+        var router = String(url).indexOf(options.url) !== -1 && init &&
+            typeof init.body === "string" && init.body.indexOf(options.output) !== -1;
+        if (!dependencies && !router) {
+            return nativeFetch(url, init);
+        }
+        init = Object.assign({}, init);
+        init.headers = new Headers(init.headers);
+        init.headers.set(options.header, loaded.join(","));
+        if (dependencies) {
+            init.headers.set(options.pathname, window.location.pathname);
+        }
+        return nativeFetch(url, init).then(function (response) {
+            if (response.headers.get(options.reload)) {
+                window.location.reload();
+                return new Promise(function () {});
+            }
+            var modules = response.headers.get(options.header);
+            if (dependencies && modules) {
+                modules.split(",").forEach(function (module) {
+                    if (loaded.indexOf(module) === -1) {
+                        loaded.push(module);
+                    }
+                });
+                window.sessionStorage.setItem(key, JSON.stringify(loaded));
+            }
+            return response;
+        });
+    };
+})(%s);
+"""
+
+
+def _page_callbacks_script(app):
+    """
+    Returns the script keeping track of the pages whose callbacks the browser has,
+    or an empty string without the `page_callbacks` option.
+    """
+    if not _config["page_callbacks"]:
+        return ""
+    options = dict(
+        url=app.get_relative_path("/_dash-update-component"),
+        dependencies=app.get_relative_path("/_dash-dependencies"),
+        output=f"..{_ID_CONTENT}.children...{_ID_STORE}.data..",
+        header=_PAGE_CALLBACKS_HEADER,
+        reload=_RELOAD_HEADER,
+        pathname=_PATHNAME_HEADER,
+    )
+    options = json.dumps(options).replace("</", "<\\/")
+    return f"<script>{_PAGE_CALLBACKS_SCRIPT % options}</script>"
+
+
+def _page_module(app, pathname):
+    """
+    Returns the module of the page at `pathname`, or of the 404 page.
+    """
+    page, _ = _path_to_page(app, app.strip_relative_path(pathname))
+    return page.get("module", "pages.not_found_404")
+
+
+def _loaded_page_callbacks():
+    """
+    Returns the page modules whose callbacks the browser has, sent by the script.
+    """
+    loaded = flask.request.headers.get(_PAGE_CALLBACKS_HEADER, "")
+    return {module for module in loaded.split(",") if module}
+
+
+def _reload_app(response):
+    response.headers[_RELOAD_HEADER] = "1"
+    return response
+
+
+def _client_cache_script(app):
+    """
+    Returns the script of the client side cache of the router callback responses,
+    or an empty string when no page is registered with `client_cache=True`.
+    """
+    cacheable = [page for page in dash.page_registry.values() if page["client_cache"]]
+    if not cacheable:
+        return ""
+    if _config["prefetch"] not in (None, "hover", "viewport"):
+        raise ValueError(
+            f"Unknown prefetch option {_config['prefetch']!r}, "
+            f"expected None, 'hover' or 'viewport'"
+        )
+
+    options = dict(
+        url=app.get_relative_path("/_dash-update-component"),
+        output=f"..{_ID_CONTENT}.children...{_ID_STORE}.data..",
+        outputs=[
+            {"id": _ID_CONTENT, "property": "children"},
+            {"id": _ID_STORE, "property": "data"},
+        ],
+        location=_ID_LOCATION,
+        header=_CLIENT_CACHE_HEADER,
+        # Only the pages without path variables are prefetched
+        paths=[
+            app.get_relative_path(page["path"])
+            for page in cacheable
+            if not page["path_template"]
+        ],
+        size=_config["client_cache_size"],
+        prefetch=_config["prefetch"],
+    )
+    # `</` would close the script tag
+    options = json.dumps(options).replace("</", "<\\/")
+    return f"<script>{_CLIENT_CACHE_SCRIPT % options}</script>"
+
+
+def _render_index(compiled, values):
+    return "".join(
+        literal if field is None else literal + str(values[field])
+        for literal, field in compiled
+    )
+
+
+def _set_index_validators(page, etag, static_meta):
+    """
+    Sets the ETag, Last-Modified and Cache-Control headers of the index response,
+    which becomes a 304 when the browser or proxy already has it. The Last-Modified
+    date is only set when the title and description are not functions, since the
+    index then only changes with the registry.
+    """
+
+    @flask.after_this_request
+    def make_conditional(response):
+        response.set_etag(etag, weak=True)
+        if static_meta:
+            response.last_modified = _index_modified
+        if page.get("cache_control"):
+            response.headers["Cache-Control"] = page["cache_control"]
+        return response.make_conditional(flask.request)
+
+
+def _clear_index_cache():
+    global _index_template, _index_modified
+    _index_template = None
+    # Whole seconds, the precision of the Last-Modified header
+    _index_modified = datetime.now(timezone.utc).replace(microsecond=0)
+    with _index_cache_lock:
+        _index_cache.clear()
+
+
+# Event loop of the async layout, title and description functions, run by a thread
+# of the worker process
+_event_loop = None
+_event_loop_pid = None
+_event_loop_lock = threading.Lock()
+
+
+def _get_event_loop():
+    global _event_loop, _event_loop_pid
+    with _event_loop_lock:
+        if _event_loop is None or _event_loop_pid != os.getpid():
+            _event_loop = asyncio.new_event_loop()
+            _event_loop_pid = os.getpid()
+            threading.Thread(
+                target=_event_loop.run_forever, name="dash-labs-pages", daemon=True
+            ).start()
+        return _event_loop
+
+
+def _resolve(*values):
+    """
+    Returns the values, with the awaitables returned by the `async def` layout, title
+    and description functions awaited concurrently on the event loop of the plugin.
+    """
+    awaitables = [value for value in values if inspect.isawaitable(value)]
+    if not awaitables:
+        return values
+
+    async def gather():
+        return await asyncio.gather(*awaitables)
+
+    results = iter(
+        asyncio.run_coroutine_threadsafe(gather(), _get_event_loop()).result()
+    )
+    return tuple(
+        next(results) if inspect.isawaitable(value) else value for value in values
+    )
+
+
+def _layout_cache_key(page, path_variables, query_parameters):
+    return json.dumps(
+        [page["module"], path_variables or {}, query_parameters],
+        sort_keys=True,
+        default=str,
+    )
+
+
+def _call_layout(page, layout, path_variables, query_parameters):
+    if page.get("process_pool"):
+        return _SerializedLayout(
+            _get_process_pool()
+            .submit(_serialize_layout, layout, path_variables, query_parameters)
+            .result()
+        )
+    return _resolve(
+        layout(**path_variables, **query_parameters)
+        if path_variables
+        else layout(**query_parameters)
+    )[0]
+
+
+class _SerializedLayout:
+    """
+    A layout serialized to JSON by a process of the pool. The router inserts the
+    JSON as is in its response, the layout caches store it as a component.
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    def to_plotly_json(self):
+        return json.loads(self.data)
+
+
+def _serialize_layout(layout, path_variables, query_parameters):
+    """
+    Renders a layout in a process of the pool and returns its JSON.
+    """
+    layout = _call_layout({}, layout, path_variables, query_parameters)
+    return json.dumps(layout, cls=PlotlyJSONEncoder).encode("utf-8")
+
+
+# Processes rendering the layouts of the pages registered with `process_pool=True`
+_process_pool = None
+_process_pool_pid = None
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool():
+    global _process_pool, _process_pool_pid
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool_pid != os.getpid():
+            # Spawned rather than forked, the worker has threads running
+            _process_pool = ProcessPoolExecutor(
+                max_workers=_config["process_pool_workers"],
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _process_pool_pid = os.getpid()
+        return _process_pool
+
+
+class _Flight:
+    """
+    A layout being rendered, awaited by the requests for the same layout.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.layout = None
+        self.error = None
+
+
+# Layouts being rendered in this process, by layout cache key
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _render_layout(page, layout, path_variables, query_parameters):
+    """
+    Calls the layout function of the page, through the page's layout cache
+    when it has one. Concurrent requests for the same layout of a page with a
+    cache wait for a single call of the layout function, in this process and,
+    with the lock of a shared cache, in the other workers.
+    """
+    cache = page.get("cache")
+    if cache is None:
+        return _call_layout(page, layout, path_variables, query_parameters)
+
+    key = _layout_cache_key(page, path_variables, query_parameters)
+    cached = cache.get(key)
+    if cached is not LayoutCache.undefined:
+        _count_layout_cache(page, "hit")
+        return cached
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    _count_layout_cache(page, "miss" if leader else "coalesced")
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.layout
+
+    try:
+        with cache.lock(key):
+            # Another worker may have rendered it while this one waited for the lock
+            flight.layout = cache.get(key)
+            if flight.layout is LayoutCache.undefined:
+                flight.layout = _call_layout(
+                    page, layout, path_variables, query_parameters
+                )
+                cache.set(key, flight.layout)
+        return flight.layout
+    except Exception as err:
+        flight.error = err
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+# Stands for a serialized layout in the JSON of the routing callback response
+_SERIALIZED_LAYOUT_TOKEN = f"_pages_plugin_serialized_layout_{uuid.uuid4().hex}"
+
+# Serialized static layout and compressed routing response, by module
+_serialized_layouts = {}
+_compressed_responses = {}
 
 
-def _parse_query_string(search):
+def _serialized_layout(page):
+    """
+    Returns the JSON of the static layout of the page, serialized once, or None
+    when the layout holds session values, which are serialized for each session.
+    """
+    layout = page["layout"]
+    serialized = _serialized_layouts.get(page["module"])
+    if serialized is None or serialized[0] is not layout:
+        if _has_session_values(layout):
+            serialized = (layout, None)
+        else:
+            data = json.dumps(layout, cls=PlotlyJSONEncoder).encode("utf-8")
+            serialized = (layout, data)
+        _serialized_layouts[page["module"]] = serialized
+    return serialized[1]
+
+
+def _has_session_values(value):
+    """
+    Returns whether a layout holds a `dash_labs.session` value, in the props of
+    its components or in the lists and dicts of their props.
+    """
+    if isinstance(value, SessionValue):
+        return True
+    if isinstance(value, Component):
+        return any(
+            _has_session_values(getattr(value, prop, None))
+            for prop in value._prop_names
+        )
+    if isinstance(value, (list, tuple)):
+        return any(_has_session_values(v) for v in value)
+    if isinstance(value, dict):
+        return any(_has_session_values(v) for v in value.values())
+    return False
+
+
+def _serialized_layout_placeholder(serialized, compress_module=None):
+    """
+    Returns the placeholder to return from the routing callback instead of a
+    layout already serialized to JSON. The serialized layout replaces it in the
+    JSON of the response, which is gzipped once for `compress_module`.
+    """
+
+    @flask.after_this_request
+    def insert_serialized_layout(response):
+        data = response.get_data().replace(
+            f'"{_SERIALIZED_LAYOUT_TOKEN}"'.encode("utf-8"), serialized
+        )
+        if (
+            compress_module is not None
+            and "gzip" in flask.request.headers.get("Accept-Encoding", "")
+            and not getattr(flask.g, "session_changes", None)
+        ):
+            compressed = _compressed_responses.get(compress_module)
+            if compressed is None or compressed[0] != data:
+                compressed = (data, gzip.compress(data))
+                _compressed_responses[compress_module] = compressed
+            response.set_data(compressed[1])
+            response.headers["Content-Encoding"] = "gzip"
+            response.vary.add("Accept-Encoding")
+        else:
+            response.set_data(data)
+        return response
+
+    return _SERIALIZED_LAYOUT_TOKEN
+
+
+def _layout_skeleton(layout):
+    """
+    Returns the components of the layout that have an `id`, reduced to their
+    `type`, `namespace` and `id` as JSON data. That is all the validation of
+    the callbacks against the `validation_layout` needs.
+    """
+    if isinstance(layout, (list, tuple)):
+        return [c for item in layout for c in _layout_skeleton(item)]
+    if not isinstance(layout, Component):
+        return []
+    components = [layout] if getattr(layout, "id", None) is not None else []
+    components.extend(layout._traverse_ids())  # pylint: disable=protected-access
+    return [
+        dict(type=c._type, namespace=c._namespace, props={"id": c.id})
+        for c in components
+    ]
+
+
+def _skeleton_dependencies(pages_folder):
+    """
+    Returns a fingerprint of what the skeletons of the page layouts depend on besides
+    the page module: the versions of dash and dash_labs and the Python files of the app,
+    the modules of its components included.
+    """
+    app_folder = os.path.dirname(os.path.abspath(pages_folder))
+    files = []
+    for (root, dirs, filenames) in os.walk(app_folder):
+        # Not the caches, hidden folders and virtual environments
+        dirs[:] = sorted(
+            d
+            for d in dirs
+            if not d.startswith((".", "_"))
+            and d != "node_modules"
+            and not os.path.exists(os.path.join(root, d, "pyvenv.cfg"))
+        )
+        for filename in sorted(filenames):
+            if filename.endswith(".py"):
+                stat = os.stat(os.path.join(root, filename))
+                file = os.path.relpath(os.path.join(root, filename), app_folder)
+                files.append([file.replace("\\", "/"), stat.st_mtime_ns, stat.st_size])
+    dependencies = [dash.__version__, __version__, files]
+    return hashlib.sha256(json.dumps(dependencies).encode("utf-8")).hexdigest()
+
+
+def _page_skeletons(pages_folder, files):
+    """
+    Returns the skeletons of the page layouts, and whether the manifest `files` were
+    updated with new skeletons. A skeleton in the manifest is used as long as its
+    page module and the dependencies of the skeletons didn't change.
+    """
+    entries = {entry["module"]: entry for entry in files.values()}
+    dependencies = _skeleton_dependencies(pages_folder) if entries else None
+    manifest_changed = False
+
+    children = []
+    for page in dash.page_registry.values():
+        entry = entries.get(page["module"])
+        if (
+            entry is not None
+            and entry.get("validation_skeleton") is not None
+            and entry.get("skeleton_dependencies") == dependencies
+        ):
+            children.extend(entry["validation_skeleton"])
+            continue
+        if isinstance(page["layout"], _LazyLayout):
+            continue
+        skeleton = _layout_skeleton(
+            _resolve(page["layout"]())[0]
+            if callable(page["layout"])
+            else page["layout"]
+        )
+        children.extend(skeleton)
+        if entry is not None:
+            entry["validation_skeleton"] = skeleton
+            entry["skeleton_dependencies"] = dependencies
+            manifest_changed = True
+    return children, manifest_changed
+
+
+def _validation_layout(app, pages_folder):
+    """
+    Builds the `validation_layout` from the skeletons of the page layouts. The
+    skeleton of a page in `pages/` is kept in the manifest, when there is one,
+    so the layout is only rendered again once the module, the other Python files
+    of the app or the versions of dash and dash_labs changed. Without a
+    manifest, every page layout is rendered. Pages that are not imported yet and
+    have no skeleton in the manifest are left out, they don't define callbacks.
+    """
+    manifest_path = _manifest_path(pages_folder)
+    files = (_read_manifest(manifest_path) if manifest_path else None) or {}
+    children, manifest_changed = _page_skeletons(pages_folder, files)
+
+    if manifest_changed and not _config["trust_manifest"]:
+        try:
+            _write_manifest(manifest_path, files)
+        except (OSError, TypeError) as err:
+            warnings.warn(
+                f"The pages manifest `{manifest_path}` can't be written: {err}",
+                stacklevel=2,
+            )
+
+    children.extend(
+        _layout_skeleton(app.layout() if callable(app.layout) else app.layout)
+    )
+    return html.Div(children)
+
+
+def _to_bool(value):
+    lowered = value.lower()
+    if lowered in ("1", "true", "yes", "on"):
+        return True
+    if lowered in ("0", "false", "no", "off", ""):
+        return False
+    raise ValueError(value)
+
+
+_QUERY_CONVERTERS = {
+    "string": str,
+    "int": functools.partial(_convert_segment, "int"),
+    "float": functools.partial(_convert_segment, "float"),
+    "uuid": functools.partial(_convert_segment, "uuid"),
+    "bool": _to_bool,
+}
+
+_QueryParameter = namedtuple("_QueryParameter", ["convert", "default", "multiple"])
+
+# Compiled `query` schema of each registered module
+_query_schemas = {}
+
+
+def _compile_query(module, query):
+    """
+    Validates the `query` of a page and returns its `_QueryParameter`s by name.
+    """
+    schema = {}
+    for name, spec in query.items():
+        default = None
+        if isinstance(spec, tuple):
+            spec, default = spec
+        multiple = isinstance(spec, list)
+        if multiple:
+            if len(spec) != 1:
+                raise Exception(
+                    f"The converter of the `query` parameter `{name}` of {module} "
+                    f"must be in a list of one, got {spec}"
+                )
+            spec = spec[0]
+        convert = _QUERY_CONVERTERS.get(spec) if isinstance(spec, str) else spec
+        if not callable(convert):
+            raise Exception(
+                f"Invalid converter {spec!r} of the `query` parameter `{name}` of {module}, "
+                f"expected one of {list(_QUERY_CONVERTERS)} or a function"
+            )
+        schema[name] = _QueryParameter(convert, default, multiple)
+    return schema
+
+
+def _parse_declared_query(parsed_qs, schema):
+    """
+    Returns the declared query parameters, converted, with the missing and invalid
+    ones set to their default. The other parameters are dropped.
+    """
+    query_parameters = {}
+    for name, parameter in schema.items():
+        values = parsed_qs.get(name)
+        try:
+            if values is None:
+                value = _query_default(parameter)
+            elif parameter.multiple:
+                value = [parameter.convert(v) for v in values]
+            else:
+                value = parameter.convert(values[0])
+        except (ValueError, TypeError):
+            value = _query_default(parameter)
+        query_parameters[name] = value
+    return query_parameters
+
+
+def _query_default(parameter):
+    # A new list for each request, the layout functions may modify it
+    if parameter.multiple:
+        return [] if parameter.default is None else list(parameter.default)
+    return parameter.default
+
+
+def _parse_query_string(search, schema=None):
     if search and len(search) > 0 and search[0] == "?":
         search = search[1:]
     else:
+        search = ""
+
+    if schema is not None:
+        return _parse_declared_query(parse_qs(search), schema)
+    if not search:
         return {}
 
     parsed_qs = {}
@@ -503,25 +2669,3 @@ def _parse_query_string(search):
         v = v[0] if len(v) == 1 else v
         parsed_qs[k] = v
     return parsed_qs
-
-
-def _parse_path_variables(pathname, path_template):
-    """
-    creates the dict of path variables passed to the layout
-    e.g. path_template= "/asset/<asset_id>"
-         if pathname provided by the browser is "/assets/a100"
-         returns **{"asset_id": "a100"}
-    """
-    path_segments = pathname.split("/")
-    template_segments = path_template.split("/")
-
-    if len(path_segments) != len(template_segments):
-        return None
-
-    path_vars = {}
-    for path_segment, template_segment in zip(path_segments, template_segments):
-        if template_segment.startswith("<"):
-            path_vars[template_segment[1:-1]] = path_segment
-        elif template_segment != path_segment:
-            return None
-    return path_vars
@@ -0,0 +1,1233 @@
+import gzip
+import json
+import os
+import runpy
+import sys
+import time
+import uuid
+import warnings
+
+import pytest
+
+import dash
+from dash import Dash, html
+
+from dash_labs.plugins import pages, register_page
+from dash_labs.plugins.layout_cache import (
+    LayoutCache,
+    MemoryLayoutCache,
+    DiskcacheLayoutCache,
+)
+
+
+@pytest.fixture
+def pages_app():
+    with warnings.catch_warnings():
+        # There is no `pages` folder next to the tests.
+        warnings.simplefilter("ignore")
+        app = Dash(__name__, plugins=[pages])
+    app.layout = html.Div(pages.page_container)
+    return app
+
+
+def test_pages001_route_index(pages_app):
+    register_page("home", path="/", layout=html.Div("home"))
+    register_page("about", path="/about", layout=html.Div("about"))
+    register_page(
+        "asset",
+        path_template="/asset/<asset_id>",
+        layout=html.Div("asset"),
+    )
+    register_page(
+        "department",
+        path_template="/asset/<asset_id>/department/<dept_id>",
+        layout=html.Div("department"),
+    )
+    register_page(
+        "asset_new", path="/asset/new", order=-1, layout=html.Div("new asset")
+    )
+
+    def resolve(path_id):
+        page, path_variables = pages._path_to_page(pages_app, path_id)
+        return page.get("module"), path_variables
+
+    assert resolve("") == ("home", None)
+    assert resolve("about") == ("about", None)
+    assert resolve("asset/a100") == ("asset", {"asset_id": "a100"})
+    assert resolve("asset/a100/department/d1") == (
+        "department",
+        {"asset_id": "a100", "dept_id": "d1"},
+    )
+    # The static page comes first in the registry, so it wins over the template.
+    assert resolve("asset/new") == ("asset_new", None)
+    assert resolve("asset/a100/department") == (None, None)
+    assert resolve("missing") == (None, None)
+
+
+def test_pages002_route_index_rebuilt_on_register(pages_app):
+    register_page("about", path="/about", layout=html.Div("about"))
+    assert pages._path_to_page(pages_app, "contact") == ({}, None)
+
+    register_page("contact", path="/contact", layout=html.Div("contact"))
+    page, _ = pages._path_to_page(pages_app, "contact")
+    assert page is dash.page_registry["contact"]
+
+
+def test_pages003_typed_path_variables(pages_app):
+    register_page(
+        "asset", path_template="/asset/<int:asset_id>", layout=html.Div("asset")
+    )
+    register_page(
+        "run", path_template="/run/<uuid:run_id>/<float:x>", layout=html.Div("run")
+    )
+    register_page("docs", path_template="/docs/<path:rest>", layout=html.Div("docs"))
+
+    def resolve(path_id):
+        page, path_variables = pages._path_to_page(pages_app, path_id)
+        return page.get("module"), path_variables
+
+    assert resolve("asset/100") == ("asset", {"asset_id": 100})
+    assert resolve("asset/a100") == (None, None)
+    assert resolve("run/4b4c6a0e-52c5-4a8a-9f4a-8f0a2b3ad1c1/1.5") == (
+        "run",
+        {"run_id": uuid.UUID("4b4c6a0e-52c5-4a8a-9f4a-8f0a2b3ad1c1"), "x": 1.5},
+    )
+    assert resolve("run/not-a-uuid/1.5") == (None, None)
+    assert resolve("docs/guide/install") == ("docs", {"rest": "guide/install"})
+    assert resolve("docs") == (None, None)
+
+    index = pages._get_route_index()
+    assert index.match("asset/7") == (dash.page_registry["asset"], {"asset_id": 7})
+    assert index.match("asset/x") == ({}, None)
+
+
+def test_pages004_invalid_path_template(pages_app):
+    with pytest.raises(Exception, match="Unknown converter"):
+        register_page("bad", path_template="/a/<bool:flag>", layout="bad")
+    with pytest.raises(Exception, match="must be the last segment"):
+        register_page("bad", path_template="/a/<path:rest>/b", layout="bad")
+
+
+def test_pages005_route_cache(pages_app):
+    pages.configure(route_cache_size=2)
+    try:
+        register_page("about", path="/about", layout=html.Div("about"))
+
+        pages._path_to_page(pages_app, "about")
+        pages._path_to_page(pages_app, "about")
+        pages._path_to_page(pages_app, "missing")
+        pages._path_to_page(pages_app, "missing")
+        info = pages.route_cache_info()
+        assert (info.hits, info.misses, info.maxsize, info.currsize) == (2, 2, 2, 2)
+
+        # Registering a page clears the cache, including the cached 404s.
+        register_page("missing", path="/missing", layout=html.Div("found"))
+        assert pages.route_cache_info().currsize == 0
+        page, _ = pages._path_to_page(pages_app, "missing")
+        assert page["module"] == "missing"
+    finally:
+        pages.configure(route_cache_size=1024)
+
+    with pytest.raises(ValueError, match="Unknown option"):
+        pages.configure(route_cache=10)
+
+
+def test_pages006_registry_order(pages_app):
+    register_page("pages.b", layout="b")
+    register_page("pages.home", path="/", layout="home")
+    register_page("pages.a", layout="a")
+    assert list(dash.page_registry) == ["pages.home", "pages.a", "pages.b"]
+    assert dash.page_registry["pages.home"]["order"] == 0
+
+    # Once an order is supplied, the home page loses its default order.
+    register_page("pages.c", order=10, layout="c")
+    register_page("pages.d", order=2, layout="d")
+    assert dash.page_registry["pages.home"]["order"] is None
+    assert list(dash.page_registry.keys()) == [
+        "pages.c",
+        "pages.d",
+        "pages.a",
+        "pages.b",
+        "pages.home",
+    ]
+    assert [p["module"] for p in dash.page_registry.values()] == list(
+        dash.page_registry
+    )
+
+
+def test_pages007_infer_image_from_app_assets_folder(tmp_path):
+    for filename in ["logo.png", "app.jpeg", "birds.png", "notes.txt"]:
+        (tmp_path / filename).write_text("")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        Dash(__name__, plugins=[pages], assets_folder=str(tmp_path))
+
+    register_page("pages.birds", layout="birds")
+    register_page("pages.notes", layout="notes")
+    assert dash.page_registry["pages.birds"]["image"] == "birds.png"
+    assert dash.page_registry["pages.notes"]["image"] == "app.jpeg"
+
+    # The folder is only scanned again when refreshing after a change.
+    (tmp_path / "notes.gif").write_text("")
+    assert pages._infer_image("pages.notes") == "app.jpeg"
+    assert pages._infer_image("pages.notes", refresh=True) == "notes.gif"
+
+
+@pytest.fixture
+def pages_folder(tmp_path, monkeypatch):
+    """A `pages` folder next to an app created from the temporary directory."""
+    (tmp_path / "pages").mkdir()
+    (tmp_path / "pages" / "__init__.py").write_text("")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield tmp_path / "pages"
+    for module in [m for m in sys.modules if m == "pages" or m.startswith("pages.")]:
+        del sys.modules[module]
+
+
+def test_pages008_lazy_import(pages_folder):
+    (pages_folder / "lazy.py").write_text(
+        "from dash import html\n"
+        "from dash_labs.plugins import register_page\n"
+        "IMPORTED = True\n"
+        "register_page(__name__, path='/lazy', title='Lazy page', order=1)\n"
+        "def layout(**kwargs):\n"
+        "    return html.Div('lazy')\n"
+    )
+    (pages_folder / "with_callback.py").write_text(
+        "from dash import html, callback, Output, Input\n"
+        "from dash_labs.plugins import register_page\n"
+        "register_page(__name__)\n"
+        "layout = html.Div([html.Button(id='btn'), html.Div(id='out')])\n"
+        "@callback(Output('out', 'children'), Input('btn', 'n_clicks'))\n"
+        "def update(n_clicks):\n"
+        "    return n_clicks\n"
+    )
+
+    pages.configure(lazy_import=True)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            Dash("lazy_app", plugins=[pages])
+    finally:
+        pages.configure(lazy_import=False)
+
+    assert "pages.lazy" not in sys.modules
+    assert "pages.with_callback" in sys.modules
+    page = dash.page_registry["pages.lazy"]
+    assert (page["path"], page["title"], page["order"]) == ("/lazy", "Lazy page", 1)
+
+    assert page["layout"]().children == "lazy"
+    assert sys.modules["pages.lazy"].IMPORTED
+    assert dash.page_registry["pages.lazy"] is page
+    assert not isinstance(page["layout"], pages._LazyLayout)
+
+
+def test_pages009_read_registration():
+    assert pages._read_registration(
+        "register_page(__name__, path='/a', redirect_from=['/b'])", "pages.a"
+    ) == (["pages.a"], {"path": "/a", "redirect_from": ["/b"]})
+    # Not literals
+    assert (
+        pages._read_registration("register_page(__name__, title=t)", "pages.a") is None
+    )
+    assert pages._read_registration("register_page('other')", "pages.a") is None
+    assert (
+        pages._read_registration("register_page(__name__, bad=1, **k)", "pages.a")
+        is None
+    )
+
+
+def router_request(client, pathname, search="", **kwargs):
+    """Calls the router callback of the pages plugin, like `dcc.Location` does."""
+    content, store, location = pages._ID_CONTENT, pages._ID_STORE, pages._ID_LOCATION
+    return client.post(
+        "/_dash-update-component",
+        json={
+            "output": f"..{content}.children...{store}.data..",
+            "outputs": [
+                {"id": content, "property": "children"},
+                {"id": store, "property": "data"},
+            ],
+            "inputs": [
+                {"id": location, "property": "pathname", "value": pathname},
+                {"id": location, "property": "search", "value": search},
+            ],
+            "changedPropIds": [f"{location}.pathname"],
+            "state": [],
+        },
+        **kwargs,
+    )
+
+
+def navigate(client, pathname, search=""):
+    response = router_request(client, pathname, search)
+    assert response.status_code == 200
+    return response.get_json()["response"]
+
+
+def test_pages010_router(pages_folder):
+    (pages_folder / "lazy.py").write_text(
+        "from dash import html\n"
+        "from dash_labs.plugins import register_page\n"
+        "register_page(__name__, path_template='/lazy/<int:n>')\n"
+        "def layout(n=None, **kwargs):\n"
+        "    return html.Div(f'lazy {n + 1} {kwargs}')\n"
+    )
+    pages.configure(lazy_import=True)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            app = Dash("router_app", plugins=[pages])
+    finally:
+        pages.configure(lazy_import=False)
+    app.layout = html.Div(pages.page_container)
+    client = app.server.test_client()
+
+    assert "<title>Lazy</title>" in client.get("/lazy/1").get_data(as_text=True)
+    assert "pages.lazy" not in sys.modules
+
+    response = navigate(client, "/lazy/41", "?q=1")
+    assert response[pages._ID_CONTENT]["children"]["props"]["children"] == (
+        "lazy 42 {'q': '1'}"
+    )
+    assert response[pages._ID_STORE]["data"] == {"title": "Lazy"}
+
+    response = navigate(client, "/lazy/a")
+    assert response[pages._ID_CONTENT]["children"]["props"]["children"] == "404"
+
+
+def test_pages011_manifest(pages_folder, monkeypatch):
+    (pages_folder / "home.py").write_text(
+        "from dash_labs.plugins import register_page\n"
+        "register_page(__name__, path='/')\n"
+        "layout = 'home'\n"
+    )
+    (pages_folder / "helpers.py").write_text("VALUE = 1\n")
+    manifest_path = pages.build_manifest(str(pages_folder))
+    assert not [p for p in pages_folder.iterdir() if p.suffix == ".tmp"]
+
+    with open(manifest_path) as f:
+        files = json.load(f)["files"]
+    assert files["home.py"]["module"] == "pages.home"
+    assert files["home.py"]["registration"] == [["pages.home"], {"path": "/"}]
+    assert not files["helpers.py"]["registers_page"]
+
+    # Unchanged modules are not read again.
+    reads = []
+    real_open = open
+
+    def tracking_open(file, *args, **kwargs):
+        reads.append(os.path.basename(str(file)))
+        return real_open(file, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", tracking_open)
+    (pages_folder / "helpers.py").write_text("VALUE = 2\n")
+    assert pages._discover_pages(str(pages_folder), manifest_path) != files
+    assert "home.py" not in reads
+    assert "helpers.py" in reads
+    monkeypatch.undo()
+
+    # A trusted manifest is used without walking the folder.
+    (pages_folder / "home.py").unlink()
+    found = pages._discover_pages(str(pages_folder), manifest_path, True)
+    assert "home.py" in found
+
+
+def test_pages012_validation_skeleton(pages_folder):
+    (pages_folder / "graph.py").write_text(
+        "from dash import html, dcc\n"
+        "from dash_labs.plugins import register_page\n"
+        "register_page(__name__)\n"
+        "def layout(**kwargs):\n"
+        "    with open('calls.txt', 'a') as f:\n"
+        "        f.write('call')\n"
+        "    return html.Div([html.P('text'), dcc.Graph(id='graph', figure={})])\n"
+    )
+
+    def first_request():
+        sys.modules.pop("pages.graph", None)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            app = Dash("skeleton_app", plugins=[pages])
+        app.layout = html.Div(pages.page_container)
+        app.server.test_client().get("/")
+        return app
+
+    pages.configure(manifest=True)
+    try:
+        app = first_request()
+        assert app.validation_layout.children[0] == {
+            "type": "Graph",
+            "namespace": "dash_core_components",
+            "props": {"id": "graph"},
+        }
+        assert pages._ID_CONTENT in [
+            c["props"]["id"] for c in app.validation_layout.children
+        ]
+        assert (pages_folder.parent / "calls.txt").read_text() == "call"
+
+        # The skeleton is read from the manifest, the layout isn't called again.
+        app = first_request()
+        assert app.validation_layout.children[0]["props"]["id"] == "graph"
+        assert (pages_folder.parent / "calls.txt").read_text() == "call"
+    finally:
+        pages.configure(manifest=None)
+
+
+@pytest.mark.parametrize("cache", [True, 60, "diskcache"])
+def test_pages013_layout_cache(pages_app, cache, tmp_path):
+    if cache == "diskcache":
+        cache = DiskcacheLayoutCache(str(tmp_path))
+    calls = []
+
+    def layout(asset_id=None, **query):
+        calls.append((asset_id, query))
+        return html.Div(f"asset {asset_id} {query}")
+
+    register_page(
+        "asset", path_template="/asset/<asset_id>", layout=layout, cache=cache
+    )
+    client = pages_app.server.test_client()
+    client.get("/")
+    calls.clear()  # rendered once for the validation layout
+
+    first = navigate(client, "/asset/a1", "?q=1")
+    assert navigate(client, "/asset/a1", "?q=1") == first
+    assert calls == [("a1", {"q": "1"})]
+
+    navigate(client, "/asset/a1", "?q=2")
+    navigate(client, "/asset/a2", "?q=1")
+    assert len(calls) == 3
+
+
+def test_pages014_memory_layout_cache_eviction(monkeypatch):
+    cache = MemoryLayoutCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is LayoutCache.undefined
+    assert cache.get("a") == 1
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get("a") is LayoutCache.undefined
+
+
+def test_pages015_serialized_static_layouts(pages_app):
+    register_page("about", path="/about", layout=html.Div("about", id="about"))
+    register_page(
+        "asset",
+        path_template="/asset/<asset_id>",
+        layout=lambda asset_id=None: html.Div(asset_id),
+    )
+    client = pages_app.server.test_client()
+
+    response = navigate(client, "/about")
+    assert response[pages._ID_CONTENT]["children"] == {
+        "type": "Div",
+        "namespace": "dash_html_components",
+        "props": {"children": "about", "id": "about"},
+    }
+    assert pages._SERIALIZED_LAYOUT_TOKEN not in json.dumps(response)
+    assert navigate(client, "/asset/a1")[pages._ID_CONTENT]["children"]["props"] == {
+        "children": "a1"
+    }
+
+    pages.configure(compress_static_layouts=True)
+    try:
+        plain = router_request(client, "/about")
+        assert "Content-Encoding" not in plain.headers
+        compressed = router_request(
+            client, "/about", headers={"Accept-Encoding": "gzip, deflate"}
+        )
+        assert compressed.headers["Content-Encoding"] == "gzip"
+        assert gzip.decompress(compressed.get_data()) == plain.get_data()
+    finally:
+        pages.configure(compress_static_layouts=False)
+
+
+def test_pages016_index_cache(pages_app):
+    calls = []
+
+    def title(asset_id=None):
+        calls.append(asset_id)
+        return f"Asset {asset_id}"
+
+    register_page(
+        "about",
+        path="/about",
+        title="About",
+        description="About us",
+        layout=html.Div("about"),
+    )
+    register_page(
+        "asset",
+        path_template="/asset/<asset_id>",
+        title=title,
+        layout=html.Div("asset"),
+    )
+    client = pages_app.server.test_client()
+
+    about = client.get("/about").get_data(as_text=True)
+    assert "<title>About</title>" in about
+    assert '<meta name="description" content="About us" />' in about
+    assert len(pages._index_cache) == 1
+    assert client.get("/about").get_data(as_text=True) == about
+    assert len(pages._index_cache) == 1
+
+    # Titles computed from the path variables are rendered on each request
+    assert "<title>Asset a1</title>" in client.get("/asset/a1").get_data(as_text=True)
+    client.get("/asset/a1")
+    assert calls == ["a1", "a1"]
+    assert len(pages._index_cache) == 1
+
+    pages.configure(minify_index=True)
+    try:
+        minified = client.get("/about").get_data(as_text=True)
+        assert minified.startswith("<!DOCTYPE html><html><head>")
+        assert "<title>About</title>" in minified
+    finally:
+        pages.configure(minify_index=False)
+
+
+def test_pages017_index_conditional_requests(pages_app):
+    register_page(
+        "about",
+        path="/about",
+        layout=html.Div("about"),
+        cache_control="public, max-age=300",
+    )
+    register_page("contact", path="/contact", layout=html.Div("contact"))
+    client = pages_app.server.test_client()
+
+    response = client.get("/about")
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "public, max-age=300"
+    assert response.headers["Last-Modified"]
+    assert "Cache-Control" not in client.get("/contact").headers
+    assert client.get("/contact").headers["ETag"] != etag
+
+    revalidated = client.get("/about", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.get_data() == b""
+    modified = client.get("/about", headers={"If-None-Match": 'W/"stale"'})
+    assert modified.status_code == 200
+
+    # The title changes on each visit, only the ETag tells if it changed
+    visits = []
+
+    def title():
+        visits.append(1)
+        return f"Visit {len(visits)}"
+
+    register_page("counter", path="/counter", layout=html.Div(), title=title)
+    response = client.get("/counter")
+    assert "Last-Modified" not in response.headers
+    since = client.get("/about").headers["Last-Modified"]
+    assert (
+        client.get("/counter", headers={"If-Modified-Since": since}).status_code == 200
+    )
+
+    with pytest.raises(Exception):
+        register_page("bad", path="/bad", cache_control=300)
+
+
+def test_pages018_prerender_layout():
+    pages.configure(prerender_layout=True)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            app = Dash(__name__, plugins=[pages])
+    finally:
+        pages.configure(prerender_layout=False)
+    app.layout = html.Div([html.H1("App"), pages.page_container])
+    register_page(
+        "asset",
+        path_template="/asset/<int:asset_id>",
+        title=lambda asset_id=None: f"Asset {asset_id}",
+        layout=lambda asset_id=None, **query: html.Div(f"{asset_id} {query}"),
+    )
+    register_page("about", path="/about", layout=html.Div("about"))
+    client = app.server.test_client()
+
+    def initial_layout(url):
+        response = client.get("/_dash-layout", headers={"Referer": url})
+        container = response.get_json()["props"]["children"][1]["props"]["children"]
+        return {c["props"]["id"]: c["props"] for c in container}
+
+    props = initial_layout("http://localhost/asset/7?tab=2")
+    assert props[pages._ID_LOCATION]["pathname"] == "/asset/7"
+    assert props[pages._ID_LOCATION]["search"] == "?tab=2"
+    assert props[pages._ID_CONTENT]["children"]["props"]["children"] == "7 {'tab': '2'}"
+    assert props[pages._ID_STORE]["data"] == {"title": "Asset 7"}
+
+    props = initial_layout("http://localhost/about")
+    assert props[pages._ID_CONTENT]["children"]["props"]["children"] == "about"
+
+    # Other origins, and the shared page container, are left alone
+    other_origin = initial_layout("http://example.com/about")
+    assert other_origin[pages._ID_CONTENT]["children"] is None
+    assert getattr(pages.page_container.children[1], "children", None) is None
+
+
+def test_pages019_client_cache(pages_app):
+    register_page("about", path="/about", layout=html.Div("about"), client_cache=True)
+    register_page(
+        "asset",
+        path_template="/asset/<asset_id>",
+        layout=lambda asset_id=None: html.Div(asset_id),
+        client_cache=True,
+    )
+    register_page("live", path="/live", layout=html.Div("live"))
+    client = pages_app.server.test_client()
+
+    pages.configure(prefetch="hover")
+    try:
+        index = client.get("/").get_data(as_text=True)
+    finally:
+        pages.configure(prefetch=None)
+    script = index[index.index("(function (options)") : index.index("</script>")]
+    options = json.loads(script[script.rindex("})(") + 3 : script.rindex(");")])
+    assert options["paths"] == ["/about"]
+    assert options["prefetch"] == "hover"
+    assert options["size"] == 32
+
+    header = pages._CLIENT_CACHE_HEADER
+    assert router_request(client, "/about").headers[header] == "1"
+    assert router_request(client, "/asset/a1").headers[header] == "1"
+    assert header not in router_request(client, "/live").headers
+
+
+def test_pages020_async_functions(pages_app):
+    import asyncio
+
+    async def fetch(value):
+        await asyncio.sleep(0.01)
+        return value
+
+    async def layout(asset_id=None):
+        name, owner = await asyncio.gather(fetch(asset_id), fetch("ops"))
+        return html.Div(f"{name} {owner}")
+
+    async def title(asset_id=None):
+        return await fetch(f"Asset {asset_id}")
+
+    async def description(asset_id=None):
+        return await fetch(f"About {asset_id}")
+
+    register_page(
+        "asset",
+        path_template="/asset/<asset_id>",
+        layout=layout,
+        title=title,
+        description=description,
+    )
+    client = pages_app.server.test_client()
+
+    index = client.get("/asset/a1").get_data(as_text=True)
+    assert "<title>Asset a1</title>" in index
+    assert '<meta name="description" content="About a1" />' in index
+
+    response = navigate(client, "/asset/a1")
+    assert response[pages._ID_CONTENT]["children"]["props"]["children"] == "a1 ops"
+    assert response[pages._ID_STORE]["data"] == {"title": "Asset a1"}
+
+
+@pytest.mark.parametrize("cache", [True, "diskcache"])
+def test_pages021_coalesce_layout_renders(pages_app, cache, tmp_path):
+    import threading
+
+    if cache == "diskcache":
+        cache = DiskcacheLayoutCache(str(tmp_path))
+    calls = []
+
+    def layout(asset_id=None):
+        calls.append(asset_id)
+        time.sleep(0.2)
+        return html.Div(asset_id)
+
+    register_page(
+        "asset", path_template="/asset/<asset_id>", layout=layout, cache=cache
+    )
+    page = dash.page_registry["asset"]
+    results = []
+
+    def render(asset_id):
+        results.append(pages._render_layout(page, layout, {"asset_id": asset_id}, {}))
+
+    threads = [
+        threading.Thread(target=render, args=(asset_id,))
+        for asset_id in ["a1"] * 8 + ["a2"] * 2
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(calls) == ["a1", "a2"]
+    assert sorted(r.children for r in results) == ["a1"] * 8 + ["a2"] * 2
+    assert pages._flights == {}
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="requires Python 3.7")
+def test_pages022_process_pool(pages_folder):
+    (pages_folder / "heavy.py").write_text(
+        "import os\n"
+        "from dash import html\n"
+        "from dash_labs.plugins import register_page\n"
+        "register_page(__name__, path_template='/heavy/<int:n>', process_pool=True)\n"
+        "def layout(n=None):\n"
+        "    return html.Div([html.P(sum(range(n or 0))), html.P(os.getpid())])\n"
+    )
+    pages.configure(process_pool_workers=1)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            app = Dash("process_pool_app", plugins=[pages])
+        app.layout = html.Div(pages.page_container)
+        client = app.server.test_client()
+
+        response = navigate(client, "/heavy/10")
+        total, pid = response[pages._ID_CONTENT]["children"]["props"]["children"]
+        assert total["props"]["children"] == 45
+        assert pid["props"]["children"] != os.getpid()
+    finally:
+        pages.configure(process_pool_workers=None)
+        pages._process_pool.shutdown()
+
+
+def test_pages023_redirects(pages_app):
+    register_page(
+        "asset",
+        path_template="/asset/<int:asset_id>",
+        layout=html.Div("asset"),
+        redirect_from=["/old-asset/<int:asset_id>", "/legacy/<asset_id>/view"],
+    )
+    register_page(
+        "docs",
+        path="/docs",
+        layout=html.Div("docs"),
+        redirect_from=["/help", "/manual/<path:rest>"],
+        redirect_status=302,
+    )
+    client = pages_app.server.test_client()
+    client.get("/")
+
+    response = client.get("/old-asset/42?tab=2")
+    assert response.status_code == 301
+    assert response.headers["Location"].endswith("/asset/42?tab=2")
+    assert client.get("/legacy/7/view").headers["Location"].endswith("/asset/7")
+    # Not an int, no redirect
+    assert client.get("/old-asset/a").status_code == 200
+
+    response = client.get("/manual/chapter/1")
+    assert response.status_code == 302
+    assert response.headers["Location"].endswith("/docs")
+    assert client.get("/help/").headers["Location"].endswith("/docs")
+    assert client.post("/help").status_code != 302
+
+    with pytest.raises(Exception):
+        register_page("bad", path="/bad", redirect_status=200)
+
+
+def test_pages024_redirect_missing_variable():
+    register_page(
+        "asset",
+        path_template="/asset/<asset_id>",
+        layout=html.Div("asset"),
+        redirect_from=["/old-asset/<id>"],
+    )
+    with pytest.raises(Exception, match="asset_id"):
+        pages._RedirectTable(dash.page_registry.values())
+
+
+def test_pages025_declared_query_parameters(pages_app):
+    calls = []
+
+    def layout(tab=None, year=None, ids=None, dense=None):
+        calls.append(dict(tab=tab, year=year, ids=ids, dense=dense))
+        return html.Div(tab)
+
+    register_page(
+        "report",
+        path="/report",
+        layout=layout,
+        query={
+            "tab": ("string", "summary"),
+            "year": "int",
+            "ids": ["int"],
+            "dense": ("bool", False),
+        },
+        cache=True,
+    )
+    client = pages_app.server.test_client()
+    client.get("/")
+    calls.clear()
+
+    navigate(client, "/report", "?tab=sales&year=2022&ids=1&ids=2&dense=on")
+    assert calls == [dict(tab="sales", year=2022, ids=[1, 2], dense=True)]
+
+    calls.clear()
+    navigate(client, "/report", "?year=abc&utm_source=mail")
+    assert calls == [dict(tab="summary", year=None, ids=[], dense=False)]
+
+    # Undeclared parameters don't change the layout cache key
+    navigate(client, "/report", "?utm_source=newsletter&fbclid=x")
+    assert len(calls) == 1
+
+    # The default lists are not shared by the requests
+    schema = pages._query_schemas["report"]
+    pages._parse_query_string("", schema)["ids"].append(1)
+    assert pages._parse_query_string("?ids=x", schema)["ids"] == []
+    schema = pages._compile_query("report", {"ids": (["int"], [1])})
+    pages._parse_query_string("", schema)["ids"].append(2)
+    assert pages._parse_query_string("", schema)["ids"] == [1]
+
+    with pytest.raises(Exception):
+        register_page("bad", path="/bad", query={"n": "integer"})
+
+
+def test_pages026_metrics():
+    pages.configure(metrics_path="/_dash-pages-metrics")
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            app = Dash(__name__, plugins=[pages])
+        app.layout = html.Div(pages.page_container)
+        register_page(
+            "asset",
+            path_template="/asset/<asset_id>",
+            layout=lambda asset_id=None: html.Div(asset_id),
+            title=lambda asset_id=None: f"Asset {asset_id}",
+            cache=True,
+        )
+        client = app.server.test_client()
+        client.get("/asset/a1")
+        navigate(client, "/asset/a1")
+        navigate(client, "/asset/a1")
+        navigate(client, "/missing")
+        metrics = client.get("/_dash-pages-metrics").get_data(as_text=True)
+    finally:
+        pages.configure(metrics_path=None)
+
+    lines = metrics.splitlines()
+    assert "# TYPE dash_pages_phase_seconds histogram" in lines
+    assert 'dash_pages_response_bytes_bucket{page="asset",le="+Inf"} 2' in lines
+    assert 'dash_pages_phase_seconds_count{page="asset",phase="layout"} 2' in lines
+    assert 'dash_pages_phase_seconds_count{page="asset",phase="title"} 2' in lines
+    assert 'dash_pages_phase_seconds_count{page="asset",phase="meta"} 1' in lines
+    assert 'dash_pages_response_bytes_count{page="asset"} 2' in lines
+    assert 'dash_pages_response_seconds_count{page="404"} 1' in lines
+    assert 'dash_pages_layout_cache_total{page="asset",result="hit"} 1' in lines
+    assert 'dash_pages_layout_cache_total{page="asset",result="miss"} 1' in lines
+    assert "dash_pages_not_found_total 1" in lines
+
+
+def test_pages027_meta_cache(pages_app):
+    calls = []
+
+    def title(asset_id=None):
+        calls.append(("title", asset_id))
+        return f"Asset {asset_id}"
+
+    def description(asset_id=None):
+        calls.append(("description", asset_id))
+        return f"About {asset_id}"
+
+    register_page(
+        "asset",
+        path_template="/asset/<asset_id>",
+        layout=html.Div("asset"),
+        title=title,
+        description=description,
+    )
+    client = pages_app.server.test_client()
+    client.get("/")
+    calls.clear()
+    # Without `meta_cache`, the index and the router each call the title
+    client.get("/asset/a1")
+    navigate(client, "/asset/a1")
+    assert calls == [("title", "a1"), ("description", "a1"), ("title", "a1")]
+    calls.clear()
+
+    register_page(
+        "asset",
+        path_template="/asset/<asset_id>",
+        layout=html.Div("asset"),
+        title=title,
+        description=description,
+        meta_cache=60,
+    )
+    client.get("/")
+    calls.clear()
+    assert "<title>Asset a2</title>" in client.get("/asset/a2").get_data(as_text=True)
+    assert navigate(client, "/asset/a2")[pages._ID_STORE]["data"] == {
+        "title": "Asset a2"
+    }
+    client.get("/asset/a2")
+    assert calls == [("title", "a2"), ("description", "a2")]
+
+
+def test_pages028_page_callbacks(pages_folder):
+    # A module of the app imported by the pages, its callbacks are app callbacks
+    (pages_folder.parent / "shared_navbar.py").write_text(
+        "from dash import html, callback, Output, Input\n"
+        "navbar = html.Div([html.Button(id='nav-btn'), html.Div(id='nav-out')])\n"
+        "@callback(Output('nav-out', 'children'), Input('nav-btn', 'n_clicks'))\n"
+        "def update(n_clicks):\n"
+        "    return n_clicks\n"
+    )
+    sys.modules.pop("shared_navbar", None)
+    for name in ("a", "b"):
+        (pages_folder / f"{name}.py").write_text(
+            "from dash import html, callback, Output, Input\n"
+            "from dash_labs.plugins import register_page\n"
+            "import shared_navbar\n"
+            f"register_page(__name__, path='/{name}')\n"
+            f"layout = html.Div([html.Button(id='{name}-btn'), html.Div(id='{name}-out')])\n"
+            f"@callback(Output('{name}-out', 'children'), Input('{name}-btn', 'n_clicks'))\n"
+            "def update(n_clicks):\n"
+            "    return n_clicks\n"
+        )
+    pages.configure(page_callbacks=True)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            app = Dash("page_callbacks_app", plugins=[pages])
+        app.layout = html.Div(pages.page_container)
+        client = app.server.test_client()
+        index = client.get("/a").get_data(as_text=True)
+        assert pages._PAGE_CALLBACKS_HEADER in index
+
+        def outputs(response):
+            return {c["output"] for c in response.get_json()}
+
+        response = client.get(
+            "/_dash-dependencies", headers={pages._PATHNAME_HEADER: "/a"}
+        )
+        assert "a-out.children" in outputs(response)
+        assert "b-out.children" not in outputs(response)
+        assert f"..{pages._ID_CONTENT}.children...{pages._ID_STORE}.data.." in outputs(
+            response
+        )
+        assert response.headers[pages._PAGE_CALLBACKS_HEADER] == "pages.a"
+        assert "nav-out.children" in outputs(response)
+        assert "nav-out.children" not in pages._page_callbacks["pages.a"]
+
+        response = client.get(
+            "/_dash-dependencies", headers={pages._PATHNAME_HEADER: "/b"}
+        )
+        assert {"b-out.children", "nav-out.children"} <= outputs(response)
+        assert "a-out.children" not in outputs(response)
+        # Without the pathname, e.g. with `Referrer-Policy: no-referrer`
+        response = client.get(
+            "/_dash-dependencies", headers={"Referer": "http://localhost/a"}
+        )
+        assert "a-out.children" not in outputs(response)
+
+        response = client.get(
+            "/_dash-dependencies",
+            headers={
+                pages._PATHNAME_HEADER: "/a",
+                pages._PAGE_CALLBACKS_HEADER: "pages.b",
+            },
+        )
+        assert {"a-out.children", "b-out.children"} <= outputs(response)
+        assert response.headers[pages._PAGE_CALLBACKS_HEADER] == "pages.a,pages.b"
+
+        # The browser doesn't have the callbacks of `b` yet
+        response = router_request(
+            client, "/b", headers={pages._PAGE_CALLBACKS_HEADER: "pages.a"}
+        )
+        assert response.status_code == 204
+        assert response.headers[pages._RELOAD_HEADER] == "1"
+
+        response = router_request(
+            client, "/b", headers={pages._PAGE_CALLBACKS_HEADER: "pages.a,pages.b"}
+        )
+        assert response.status_code == 200
+        assert pages._RELOAD_HEADER not in response.headers
+    finally:
+        pages.configure(page_callbacks=False)
+        sys.modules.pop("shared_navbar", None)
+
+
+def test_pages029_warmup(pages_folder, monkeypatch):
+    (pages_folder / "lazy.py").write_text(
+        "from dash import html\n"
+        "from dash_labs.plugins import register_page\n"
+        "register_page(__name__, path='/lazy', redirect_from=['/old-lazy'])\n"
+        "layout = html.Div('lazy', id='lazy')\n"
+    )
+    pages.configure(lazy_import=True)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            app = Dash("warmup_app", plugins=[pages])
+    finally:
+        pages.configure(lazy_import=False)
+    app.layout = html.Div(pages.page_container)
+    assert "pages.lazy" not in sys.modules
+
+    frozen = []
+    monkeypatch.setattr(pages.gc, "freeze", lambda: frozen.append(True), raising=False)
+    pages.warmup(app)
+    assert frozen == [True]
+    assert "pages.lazy" in sys.modules
+    assert app.server._got_first_request
+    assert pages._route_index is not None
+    assert pages._redirects is not None
+    assert "pages.lazy" in pages._serialized_layouts
+    assert "lazy" in [
+        c["props"].get("id") for c in app.validation_layout.children if "props" in c
+    ]
+
+    client = app.server.test_client()
+    assert client.get("/old-lazy").headers["Location"].endswith("/lazy")
+    assert navigate(client, "/lazy")[pages._ID_CONTENT]["children"]["props"] == {
+        "children": "lazy",
+        "id": "lazy",
+    }
+
+
+def test_pages030_export_static_pages(pages_app, tmp_path):
+    register_page("home", path="/", layout=html.Div("home"))
+    register_page("docs", path="/docs/intro", title="Intro", layout=html.Div("intro"))
+    register_page("report", path="/report", layout=lambda: html.Div("report"))
+    register_page("asset", path_template="/asset/<asset_id>", layout=html.Div("asset"))
+
+    files = pages.export_pages(pages_app, str(tmp_path), "https://example.com")
+    assert sorted(os.path.relpath(f, tmp_path) for f in files) == [
+        os.path.join("_pages_static", "docs.json"),
+        os.path.join("_pages_static", "home.json"),
+        os.path.join("docs", "intro", "index.html"),
+        "index.html",
+    ]
+
+    index = (tmp_path / "docs" / "intro" / "index.html").read_text()
+    assert "<title>Intro</title>" in index
+    assert 'content="https://example.com/docs/intro"' in index
+    assert '"/docs/intro": "/_pages_static/docs.json"' in index
+
+    client = pages_app.server.test_client()
+    layout = json.loads((tmp_path / "_pages_static" / "docs.json").read_text())
+    assert layout["response"] == navigate(client, "/docs/intro")
+
+
+def test_pages031_static_layout_session_values(pages_app, tmp_path):
+    from dash_labs.session import setup_sessions, session
+    from dash_labs.session.backends.diskcache import DiskcacheSessionBackend
+
+    register_page("user", path="/user", layout=html.Div(session.user, id="user"))
+    setup_sessions(
+        pages_app,
+        DiskcacheSessionBackend(directory=str(tmp_path)),
+        sync_session_values=False,
+    )
+
+    @pages_app.server.route("/login/<name>")
+    def login(name):
+        session.user = name
+        return name
+
+    users = {}
+    for name in ("alice", "bob"):
+        users[name] = client = pages_app.server.test_client()
+        client.get(f"/login/{name}")
+    for name, client in users.items():
+        content = navigate(client, "/user")[pages._ID_CONTENT]["children"]
+        assert content["props"]["children"] == name
+    assert pages._serialized_layout(dash.page_registry["user"]) is None
+
+
+def test_pages032_export_skips_session_values(pages_app, tmp_path):
+    from dash_labs.session import session
+
+    register_page("home", path="/", layout=html.Div("home"))
+    register_page("user", path="/user", layout=html.Div(session.user, id="user"))
+    files = pages.export_pages(pages_app, str(tmp_path / "build"))
+    assert sorted(os.path.relpath(f, tmp_path / "build") for f in files) == [
+        os.path.join("_pages_static", "home.json"),
+        "index.html",
+    ]
+
+
+def test_pages033_redirects_prefixed_app(monkeypatch):
+    folder = os.path.join(
+        os.path.dirname(__file__), "..", "docs", "demos", "multi_page_basics_prefix"
+    )
+    monkeypatch.chdir(folder)
+    monkeypatch.syspath_prepend(folder)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            app = runpy.run_path("app.py", run_name="prefix_app")["app"]
+        client = app.server.test_client()
+        client.get("/app1/")
+
+        response = client.get("/app1/old-home-page?a=1")
+        assert response.status_code == 301
+        assert response.headers["Location"].endswith("/app1/redirect?a=1")
+        assert client.get("/app1/v2/").status_code == 301
+        # Outside of the app
+        assert client.get("/old-home-page").status_code == 404
+    finally:
+        for module in [
+            m for m in sys.modules if m == "pages" or m.startswith("pages.")
+        ]:
+            del sys.modules[module]
+
+
+def test_pages034_inferred_path_of_typed_template(pages_app):
+    register_page(
+        "asset",
+        path_template="/asset/<int:asset_id>",
+        layout=lambda asset_id=None: html.Div(f"asset {asset_id}"),
+    )
+    register_page(
+        "report",
+        path="/report/latest",
+        path_template="/report/<int:report_id>",
+        layout=lambda report_id=None: html.Div(f"report {report_id}"),
+    )
+    assert dash.page_registry["asset"]["path"] == "/asset/none"
+    assert pages._path_to_page(pages_app, "asset/none") == ({}, None)
+    assert pages._path_to_page(pages_app, "report/latest")[0]["module"] == "report"
+    # A template without variables is routed by its path
+    register_page(
+        "summary", path_template="/reports/summary", layout=html.Div("summary")
+    )
+    assert pages._path_to_page(pages_app, "reports/summary") == (
+        dash.page_registry["summary"],
+        None,
+    )
+
+    client = pages_app.server.test_client()
+    client.get("/")
+    content = navigate(client, "/asset/none")[pages._ID_CONTENT]["children"]
+    assert content["props"]["children"] == "404"
+    content = navigate(client, "/asset/1")[pages._ID_CONTENT]["children"]
+    assert content["props"]["children"] == "asset 1"
+
+
+def test_pages035_redirect_one_segment_template(pages_app):
+    register_page(
+        "blog",
+        path_template="/blog/<slug>",
+        layout=lambda slug=None: html.Div(slug),
+        redirect_from=["/<slug>"],
+    )
+    register_page("home", path="/", layout=html.Div("home"))
+    client = pages_app.server.test_client()
+
+    assert client.get("/").status_code == 200
+    for path in ("/_dash-layout", "/_dash-dependencies", "/_favicon.ico"):
+        assert client.get(path).status_code == 200
+    assert client.get("/assets/missing.css").status_code != 301
+    response = client.get("/hello")
+    assert response.status_code == 301
+    assert response.headers["Location"].endswith("/blog/hello")
+
+
+def test_pages036_lazy_page_importing_callbacks(pages_folder):
+    (pages_folder.parent / "lazy_widgets.py").write_text(
+        "from dash import html, callback, Output, Input\n"
+        "widget = html.Div([html.Button(id='w-btn'), html.Div(id='w-out')])\n"
+        "@callback(Output('w-out', 'children'), Input('w-btn', 'n_clicks'))\n"
+        "def update(n_clicks):\n"
+        "    return n_clicks\n"
+    )
+    (pages_folder / "report.py").write_text(
+        "from dash_labs.plugins import register_page\n"
+        "from lazy_widgets import widget\n"
+        "register_page(__name__, path='/report')\n"
+        "layout = widget\n"
+    )
+
+    def create_app():
+        sys.modules.pop("lazy_widgets", None)
+        sys.modules.pop("pages.report", None)
+        pages.configure(lazy_import=True)
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                app = Dash("lazy_widgets_app", plugins=[pages])
+        finally:
+            pages.configure(lazy_import=False)
+        app.layout = html.Div(pages.page_container)
+        return app
+
+    try:
+        app = create_app()
+        client = app.server.test_client()
+        client.get("/")
+        with pytest.warns(UserWarning, match="w-out.children"):
+            navigate(client, "/report")
+
+        # Imported before the first request, the callback is served
+        app = create_app()
+        pages.load_pages()
+        client = app.server.test_client()
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            client.get("/")
+            navigate(client, "/report")
+        assert "w-out.children" in app.callback_map
+    finally:
+        sys.modules.pop("lazy_widgets", None)
+
+
+def test_pages037_validation_skeleton_dependencies(pages_folder):
+    (pages_folder.parent / "skeleton_components.py").write_text("ID = 'graph'\n")
+    (pages_folder / "graph.py").write_text(
+        "from dash import html, dcc\n"
+        "from dash_labs.plugins import register_page\n"
+        "from skeleton_components import ID\n"
+        "register_page(__name__)\n"
+        "def layout(**kwargs):\n"
+        "    with open('calls.txt', 'a') as f:\n"
+        "        f.write('call')\n"
+        "    return html.Div(dcc.Graph(id=ID, figure={}))\n"
+    )
+    calls = pages_folder.parent / "calls.txt"
+
+    def create_app():
+        for module in ("pages.graph", "skeleton_components"):
+            sys.modules.pop(module, None)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            app = Dash("skeleton_dependencies_app", plugins=[pages])
+        app.layout = html.Div(pages.page_container)
+        return app
+
+    def first_request():
+        app = create_app()
+        app.server.test_client().get("/")
+        return app.validation_layout.children[0]["props"]["id"]
+
+    pages.configure(manifest=True)
+    try:
+        assert first_request() == "graph"
+        assert first_request() == "graph"
+        assert calls.read_text() == "call"
+
+        # A module imported by the page changed, the skeleton is rendered again
+        (pages_folder.parent / "skeleton_components.py").write_text(
+            "ID = 'line-chart'\n"
+        )
+        assert first_request() == "line-chart"
+        assert calls.read_text() == "callcall"
+
+        # Built with the skeletons, a trusted manifest doesn't render the layouts
+        (pages_folder.parent / "skeleton_components.py").write_text("ID = 'plot'\n")
+        pages.build_manifest(str(pages_folder), app=create_app())
+        assert calls.read_text() == "callcallcall"
+        pages.configure(trust_manifest=True)
+        assert first_request() == "plot"
+        assert calls.read_text() == "callcallcall"
+    finally:
+        pages.configure(manifest=None, trust_manifest=False)
+        sys.modules.pop("skeleton_components", None)